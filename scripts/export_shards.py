@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Static JSON export of moments, sharded by tag, book, color and month
+
+Consumers that render one tag page or one book (static site, notifier)
+fetch a small shard instead of the whole of moments.json:
+
+    exports/
+    ├── manifest.json        # every shard with its moment count, size and SHA-256
+    ├── tags/priere.json
+    ├── books/JHN.json
+    ├── colors/fffeca.json
+    └── months/2025-11.json
+
+A shard is only rewritten when its content hash changes, and shards whose
+value disappeared are deleted, so a nightly run touches only what changed.
+The manifest has no timestamp for the same reason.
+
+Usage:
+    python export_shards.py           # Update changed shards
+    python export_shards.py --force   # Rewrite every shard
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from moments_keys import iter_keyed_moments
+from moments_reader import DEFAULT_MOMENTS_FILE, MomentsReader
+from moments_stats import moment_facets
+
+EXPORT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# Shard directory per moment_facets key
+FACETS = {
+    'tags': 'tags',
+    'books': 'books',
+    'colors': 'colors',
+    'months': 'months'
+}
+
+_UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def export_dir_for(moments_file) -> Path:
+    return Path(moments_file).with_name('exports')
+
+
+def shard_name(facet: str, value: str) -> str:
+    """Relative shard path, e.g. tags/priere.json"""
+    return f"{FACETS[facet]}/{_UNSAFE_CHARS.sub('_', value)}.json"
+
+
+def group_moments(moments: Iterable[Dict]) -> Dict[str, Tuple[str, str, List[str]]]:
+    """shard name -> (facet, value, serialized moments), in archive order
+
+    Each moment is serialized once and shared by all of its shards.
+    """
+    shards: Dict[str, Tuple[str, str, List[str]]] = {}
+    for key, moment in iter_keyed_moments(moments):
+        record = json.dumps({'key': key, **moment}, indent=2, ensure_ascii=False)
+        for facet, values in moment_facets(moment).items():
+            if facet not in FACETS:
+                continue
+            for value in values:
+                name = shard_name(facet, value)
+                if name not in shards:
+                    shards[name] = (facet, value, [])
+                shards[name][2].append(record)
+    return shards
+
+
+def render_shard(facet: str, value: str, records: List[str]) -> bytes:
+    """Same layout as json.dump(indent=2), built from pre-serialized moments"""
+    header = json.dumps({'facet': facet, 'value': value, 'total_moments': len(records)},
+                        indent=2, ensure_ascii=False)
+    body = ',\n'.join('    ' + record.replace('\n', '\n    ') for record in records)
+    moments = f'"moments": [\n{body}\n  ]' if records else '"moments": []'
+    return (header[:-2] + f',\n  {moments}\n}}\n').encode('utf-8')
+
+
+def _write_atomic(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(path.name + '.tmp')
+    with open(tmp_file, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_file, path)
+
+
+def load_manifest(export_dir: Path) -> Dict:
+    try:
+        with open(export_dir / MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if manifest.get('version') == EXPORT_VERSION else {}
+
+
+def export_shards(moments_file=DEFAULT_MOMENTS_FILE, export_dir=None, force: bool = False) -> Dict[str, int]:
+    """Write changed shards and the manifest; returns counts of written/unchanged/removed shards"""
+    export_dir = Path(export_dir) if export_dir else export_dir_for(moments_file)
+    previous = load_manifest(export_dir).get('shards', {})
+
+    reader = MomentsReader(moments_file)
+    shards = group_moments(reader)
+
+    entries = {}
+    written = unchanged = 0
+    for name in sorted(shards):
+        facet, value, records = shards[name]
+        content = render_shard(facet, value, records)
+        digest = hashlib.sha256(content).hexdigest()
+        entries[name] = {
+            'facet': facet,
+            'value': value,
+            'total_moments': len(records),
+            'bytes': len(content),
+            'sha256': digest
+        }
+        path = export_dir / name
+        if not force and previous.get(name, {}).get('sha256') == digest and path.exists():
+            unchanged += 1
+            continue
+        _write_atomic(path, content)
+        written += 1
+
+    removed = 0
+    for name in previous:
+        if name not in entries:
+            try:
+                os.remove(export_dir / name)
+            except OSError:
+                pass
+            removed += 1
+
+    manifest = {
+        'version': EXPORT_VERSION,
+        'total_moments': len(reader),
+        'shards': entries
+    }
+    content = (json.dumps(manifest, indent=2, ensure_ascii=False) + '\n').encode('utf-8')
+    manifest_file = export_dir / MANIFEST_NAME
+    if force or not manifest_file.exists() or manifest_file.read_bytes() != content:
+        _write_atomic(manifest_file, content)
+
+    print(f"📦 Export: {written} shards written, {unchanged} unchanged, {removed} removed ({len(entries)} total)")
+    return {'written': written, 'unchanged': unchanged, 'removed': removed}
+
+
+def main():
+    export_shards(DEFAULT_MOMENTS_FILE, force='--force' in sys.argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,38 +3,80 @@
 Script to fetch YouVersion moments and save them to JSON
 """
 import json
-import requests
 from datetime import datetime, timezone
 import os
 from typing import Dict, List, Any, Optional
-from dotenv import load_dotenv
+
+from http_cache import HttpCache
+from http_transport import open_transport
+from moments_reader import stamp_generation, write_snapshot
+from moments_stats import MomentsStats, load_stats
+
+DEFAULT_USER_ID = "224177359"
+MAX_PAGES = 50  # Safety limit to prevent infinite loops
+
+# Returned by fetch_moments_page when the page is identical to the cached one
+NO_CHANGES = {'no_changes': True}
+
+def partition_file(user_id: str, root: str = '') -> str:
+    """moments.json of a user's partition
+    
+    The default user's partition is the archive at the repository root; every
+    other account gets its own users/<user_id>/ directory (not committed), with
+    its snapshot, indexes and exports next to it.
+    """
+    if user_id == DEFAULT_USER_ID:
+        return os.path.join(root, 'moments.json')
+    return os.path.join(root, 'users', user_id, 'moments.json')
 
 class MomentsFetcher:
-    def __init__(self):
-        # Load environment variables
-        load_dotenv()
+    def __init__(self, user_id: Optional[str] = None, bearer_token: Optional[str] = None,
+                 session=None, rate_limiter=None, http_cache=None):
+        # Load environment variables (python-dotenv is optional for read-only use)
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            pass
         
         self.base_url = "https://moments.youversionapi.com/3.1/items.json"
-        self.user_id = "224177359"
+        self.user_id = user_id or os.getenv('YOUVERSION_USER_ID') or DEFAULT_USER_ID
+        self.bearer_token = bearer_token
+        
+        # Optional shared requests.Session / RateLimiter / HttpCache (see multi_sync.py)
+        self.http = open_transport(session)
+        self.rate_limiter = rate_limiter
+        self.http_cache = http_cache or HttpCache()
         
         # Auto-detect path: if running from scripts/ dir, go up one level; otherwise use current dir
         if os.path.basename(os.getcwd()) == 'scripts':
-            self.moments_file = "../moments.json"  # From scripts/ directory
-            self.last_update_file = "../last_update.txt"
+            root = ".."  # From scripts/ directory
         else:
-            self.moments_file = "moments.json"  # From root directory (GitHub Actions)
-            self.last_update_file = "last_update.txt"
+            root = ""  # From root directory (GitHub Actions)
+        self.moments_file = partition_file(self.user_id, root)
+        self.last_update_file = os.path.join(root, "last_update.txt")
             
         self.existing_moments = []
         self.last_note_date = None
+        self.watermarks = {}  # Last note date per user_id
+        self.stats = None  # MomentsStats of the existing moments
+        self.new_moments = []
+        self._latest_note_date = None
+        self._headers = None
         
+    @property
+    def headers(self) -> Dict[str, str]:
+        """API headers, built on first network use so read-only callers need no token"""
+        if self._headers is not None:
+            return self._headers
+            
         # Get bearer token from environment variable
-        bearer_token = os.getenv('YOUVERSION_BEARER_TOKEN')
+        bearer_token = self.bearer_token or os.getenv('YOUVERSION_BEARER_TOKEN')
         if not bearer_token:
             raise ValueError("YOUVERSION_BEARER_TOKEN environment variable is required")
         
         # Headers required for API authentication
-        self.headers = {
+        self._headers = {
             'Accept': '*/*',
             'Accept-Language': 'fr-FR,fr;q=0.9',
             'Authorization': f'Bearer {bearer_token}',
@@ -47,6 +89,7 @@ class MomentsFetcher:
             'X-Youversion-App-Version': '2025259',
             'X-Youversion-Client': 'youversion'
         }
+        return self._headers
         
     def load_existing_data(self):
         """Load existing moments and last update date"""
@@ -55,58 +98,91 @@ class MomentsFetcher:
                 with open(self.moments_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     self.existing_moments = data.get('moments', [])
-                    self.last_note_date = data.get('last_update')
+                    self.watermarks = data.get('last_update_by_user', {})
+                    # last_update predates per-user watermarks and only exists in the default partition
+                    if data.get('last_update') and self.user_id == DEFAULT_USER_ID:
+                        self.watermarks.setdefault(DEFAULT_USER_ID, data['last_update'])
+                    self.stats = load_stats(data)
                     print(f"Loaded {len(self.existing_moments)} existing moments")
-                    if self.last_note_date:
-                        print(f"Last note date: {self.last_note_date}")
         except Exception as e:
             print(f"Error loading existing moments: {e}")
             
         # Fallback: try to load from old separate file if JSON doesn't have last_update
-        if not self.last_note_date:
+        if self.user_id == DEFAULT_USER_ID and not self.watermarks.get(DEFAULT_USER_ID):
             try:
                 if os.path.exists(self.last_update_file):
                     with open(self.last_update_file, 'r') as f:
-                        self.last_note_date = f.read().strip()
-                        print(f"Last note date (from old file): {self.last_note_date}")
+                        legacy_date = f.read().strip()
+                    if legacy_date:
+                        self.watermarks[DEFAULT_USER_ID] = legacy_date
+                        print(f"Last note date (from old file): {legacy_date}")
             except Exception as e:
                 print(f"Error loading last update date: {e}")
+                
+        self.last_note_date = self.watermarks.get(self.user_id)
+        if self.last_note_date:
+            print(f"Last note date: {self.last_note_date}")
             
     def fetch_moments_page(self, page: int = 1) -> Dict:
-        """Fetch a specific page of moments from YouVersion API"""
+        """Fetch a specific page of moments from YouVersion API
+        
+        Returns NO_CHANGES (without parsing the body) if the page is unchanged since the last run.
+        """
+        import requests
+        
+        http = self.http
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(self.base_url)
+        
         params = {
             'only_color': 'false',
             'page': page,
             'user_id': self.user_id
         }
         
+        # Validators are only trusted while we still have the moments they led to
+        conditional = bool(self.last_note_date)
+        
         try:
             # Disable SSL verification for this specific API due to certificate issues
-            response = requests.get(
+            response = self.http_cache.get(
+                http,
                 self.base_url, 
                 headers=self.headers, 
                 params=params, 
+                conditional=conditional,
+                defer=True,  # Committed by save_data once the moments are on disk
                 timeout=30,
                 verify=False  # Disable SSL verification
             )
             response.raise_for_status()
+            if response.not_modified:
+                return NO_CHANGES
             return response.json()
         except requests.exceptions.SSLError as e:
             print(f"SSL Error on page {page}: {e}")
             print("Trying with SSL verification disabled...")
             # Fallback with SSL disabled
-            response = requests.get(
-                self.base_url, 
-                headers=self.headers, 
-                params=params, 
-                timeout=30,
-                verify=False
-            )
-            response.raise_for_status()
-            return response.json()
+            try:
+                response = http.get(
+                    self.base_url, 
+                    headers=self.headers, 
+                    params=params, 
+                    timeout=30,
+                    verify=False
+                )
+                response.raise_for_status()
+                return response.json()
+            except (requests.RequestException, ValueError) as e:
+                print(f"Error fetching page {page}: {e}")
+                return {}
         except requests.RequestException as e:
             print(f"Error fetching page {page}: {e}")
             return {}
+        except ValueError as e:
+            # 200 with a non-JSON body (e.g. an HTML maintenance page)
+            print(f"Invalid JSON on page {page}: {e}")
+            return {}
             
     def fetch_verse_text(self, usfm: str, version_id: int = 133) -> Optional[str]:
         """Fetch Bible verse text from YouVersion API - currently disabled due to API limitations"""
@@ -152,7 +228,8 @@ class MomentsFetcher:
             'content': extras.get('content', ''),
             'color': extras.get('color', ''),
             'references': formatted_references,
-            'tag': ''  # Empty tag field as requested
+            'tag': '',  # Empty tag field as requested
+            'user_id': self.user_id
         }
         
         return formatted_moment
@@ -170,96 +247,131 @@ class MomentsFetcher:
             print(f"Error comparing dates: {e}")
             return True
             
-    def fetch_all_new_moments(self) -> List[Dict]:
-        """Fetch all new moments from all pages"""
-        new_moments = []
-        page = 1
-        latest_note_date = self.last_note_date
-        
-        while page <= 50:  # Safety limit to prevent infinite loops
-            page_data = self.fetch_moments_page(page)
+    def collect_page(self, page: int, page_data: Dict) -> bool:
+        """Collect new moments from a fetched page; returns True if the next page should be fetched"""
+        if page_data is NO_CHANGES:
+            # Pages are newest first: an unchanged page means nothing new from here on
+            print(f"No changes on page {page} since last run")
+            return False
             
-            if not page_data or page_data.get('response', {}).get('code') != 200:
-                print(f"Failed to fetch page {page} or reached end")
-                break
-                
-            moments = page_data.get('response', {}).get('data', {}).get('moments', [])
+        if not page_data or page_data.get('response', {}).get('code') != 200:
+            print(f"Failed to fetch page {page} or reached end")
+            return False
             
-            if not moments:
-                print(f"No moments found on page {page}")
-                break
+        moments = page_data.get('response', {}).get('data', {}).get('moments', [])
+        
+        if not moments:
+            print(f"No moments found on page {page}")
+            return False
+            
+        page_has_new_moments = False
+        
+        for moment in moments:
+            # Process notes and highlights (kind_id: "note.v1" or "highlight.v1")
+            if moment.get('kind_id') not in ['note.v1', 'highlight.v1']:
+                continue
                 
-            page_has_new_moments = False
+            created_dt = moment.get('created_dt', '')
             
-            for moment in moments:
-                # Process notes and highlights (kind_id: "note.v1" or "highlight.v1")
-                if moment.get('kind_id') not in ['note.v1', 'highlight.v1']:
-                    continue
+            # Update the latest note date
+            latest_note_date = self._latest_note_date
+            if not latest_note_date or self.is_newer_than_last_update(created_dt):
+                if not latest_note_date or created_dt > latest_note_date:
+                    self._latest_note_date = created_dt
                     
-                created_dt = moment.get('created_dt', '')
-                
-                # Update the latest note date
-                if not latest_note_date or self.is_newer_than_last_update(created_dt):
-                    if not latest_note_date or created_dt > latest_note_date:
-                        latest_note_date = created_dt
-                        
-                # Only add if it's newer than our last update
-                if self.is_newer_than_last_update(created_dt):
-                    formatted_moment = self.format_moment(moment)
-                    # Add created_dt temporarily for deduplication, will be removed later
-                    formatted_moment['_created_dt'] = created_dt
-                    new_moments.append(formatted_moment)
-                    page_has_new_moments = True
-                    print(f"Found new moment: {formatted_moment['content'][:50]}...")
+            # Only add if it's newer than our last update
+            if self.is_newer_than_last_update(created_dt):
+                formatted_moment = self.format_moment(moment)
+                # Add created_dt temporarily for deduplication, kept as created_dt when saved
+                formatted_moment['_created_dt'] = created_dt
+                self.new_moments.append(formatted_moment)
+                page_has_new_moments = True
+                print(f"Found new moment: {formatted_moment['content'][:50]}...")
+        
+        # If this page had no new moments, we might be done
+        # but continue to next page to be thorough
+        if not page_has_new_moments:
+            print(f"No new moments on page {page}")
             
-            # If this page had no new moments, we might be done
-            # but continue to next page to be thorough
-            if not page_has_new_moments:
-                print(f"No new moments on page {page}")
-                
+        return page < MAX_PAGES
+        
+    def finish_fetch(self) -> List[Dict]:
+        """Update the watermark once all pages are collected and return the new moments"""
+        if self._latest_note_date and self._latest_note_date != self.last_note_date:
+            self.last_note_date = self._latest_note_date
+        if self.last_note_date:
+            self.watermarks[self.user_id] = self.last_note_date
+        return self.new_moments
+        
+    def start_fetch(self):
+        """Reset the state collected by collect_page"""
+        self.new_moments = []
+        self._latest_note_date = self.last_note_date
+        
+    def fetch_all_new_moments(self) -> List[Dict]:
+        """Fetch all new moments from all pages"""
+        self.start_fetch()
+        
+        page = 1
+        while self.collect_page(page, self.fetch_moments_page(page)):
             page += 1
             
-        # Update the last note date
-        if latest_note_date and latest_note_date != self.last_note_date:
-            self.last_note_date = latest_note_date
-            
-        return new_moments
+        return self.finish_fetch()
+        
+    def save_data(self, new_moments: List[Dict], watermarks: Optional[Dict[str, str]] = None):
+        """Save moments to JSON file and update last update dates (per user)"""
+        if watermarks:
+            self.watermarks.update(watermarks)
         
-    def save_data(self, new_moments: List[Dict]):
-        """Save moments to JSON file and update last update date"""
         # Combine existing and new moments
         all_moments = self.existing_moments + new_moments
         
-        # Sort by _created_dt (newest first) - using the temporary field for sorting
-        all_moments.sort(key=lambda x: x.get('_created_dt', ''), reverse=True)
+        created = lambda x: x.get('_created_dt') or x.get('created_dt', '')
+        
+        # Sort by created date (newest first) - new moments carry the temporary _created_dt
+        all_moments.sort(key=created, reverse=True)
+        
+        # Stats of the existing moments are updated with the new ones only
+        stats = self.stats or MomentsStats.from_moments(self.existing_moments)
+        new_ids = set(id(moment) for moment in new_moments)
         
         # Remove duplicates based on content and created_dt
         unique_moments = []
         seen = set()
         for moment in all_moments:
-            key = (moment.get('content', ''), moment.get('_created_dt', ''))
+            key = (moment.get('user_id'), moment.get('content', ''), created(moment))
             if key not in seen:
                 seen.add(key)
-                # Remove the temporary _created_dt field before adding to final list
-                clean_moment = {k: v for k, v in moment.items() if k != '_created_dt'}
+                if id(moment) in new_ids:
+                    # Persist the temporary _created_dt field as created_dt
+                    clean_moment = {k: v for k, v in moment.items() if k != '_created_dt'}
+                    clean_moment['created_dt'] = moment['_created_dt']
+                    stats.add(clean_moment)
+                else:
+                    clean_moment = moment
                 unique_moments.append(clean_moment)
-        
-        # Extract unique colors used
-        colors_used = list(set(moment.get('color', '') for moment in unique_moments if moment.get('color', '')))
-        colors_used.sort()  # Sort alphabetically for consistency
+            elif id(moment) not in new_ids:
+                stats.remove(moment)
                 
         data = {
             'moments': unique_moments,
             'last_updated': datetime.now(timezone.utc).isoformat(),
-            'last_update': self.last_note_date,  # Add last note date in JSON
+            'last_update': self.watermarks.get(DEFAULT_USER_ID),  # Legacy field: the default user's watermark only
+            'last_update_by_user': dict(sorted(self.watermarks.items())),
             'total_moments': len(unique_moments),
-            'colors_used': colors_used  # Add list of colors used
+            'colors_used': stats.colors_used,  # Add list of colors used
+            'stats': stats.to_dict()
         }
+        stamp_generation(data)  # Last key, checked by readers against the snapshot
         
         # Save moments with last_update included in JSON
         try:
+            os.makedirs(os.path.dirname(self.moments_file) or '.', exist_ok=True)
             with open(self.moments_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
+            write_snapshot(data, self.moments_file)
+            # Only now may the next run trust the page validators
+            self.http_cache.commit()
             print(f"Saved {len(unique_moments)} moments to {self.moments_file}")
             if self.last_note_date:
                 print(f"Last note date included in JSON: {self.last_note_date}")
@@ -276,15 +388,19 @@ class MomentsFetcher:
         # Fetch new moments
         new_moments = self.fetch_all_new_moments()
         
+        self.save_and_process(new_moments)
+        
+    def save_and_process(self, new_moments: List[Dict], watermarks: Optional[Dict[str, str]] = None):
+        """Save new moments, then run the Bible text, tags, index and export stages"""
         if new_moments:
             print(f"Found {len(new_moments)} new moments")
-            self.save_data(new_moments)
+            self.save_data(new_moments, watermarks)
             
             # Auto-fill Bible texts for new moments
             print("\n🔄 Filling Bible texts for new moments...")
             try:
                 from fill_bible_texts import BibleTextFiller
-                bible_filler = BibleTextFiller()
+                bible_filler = BibleTextFiller(self.moments_file)
                 bible_filler.fill_bible_texts()
             except Exception as e:
                 print(f"Error filling Bible texts: {e}")
@@ -293,14 +409,38 @@ class MomentsFetcher:
             print("\n🏷️  Generating AI tags for moments...")
             try:
                 from generate_tags import TagsGenerator
-                tags_generator = TagsGenerator()
+                tags_generator = TagsGenerator(self.moments_file)
                 tags_generator.run()
             except Exception as e:
                 print(f"Error generating tags: {e}")
         else:
             print("No new moments found")
             # Still update the data file to show last check time
-            self.save_data([])
+            self.save_data([], watermarks)
+            
+        # Keep the search index in sync (incremental, only changed moments are re-indexed)
+        print("\n🔎 Updating search index...")
+        try:
+            from search_index import update_index
+            update_index(self.moments_file)
+        except Exception as e:
+            print(f"Error updating search index: {e}")
+        
+        # Related moments (needs numpy; the send stage falls back to random picks without it)
+        print("\n🧭 Updating similarity index...")
+        try:
+            from similarity_index import update_index as update_similarity_index
+            update_similarity_index(self.moments_file)
+        except Exception as e:
+            print(f"Error updating similarity index: {e}")
+        
+        # Static shards for consumers that only need one tag/book/color/month
+        print("\n📦 Exporting shards...")
+        try:
+            from export_shards import export_shards
+            export_shards(self.moments_file)
+        except Exception as e:
+            print(f"Error exporting shards: {e}")
 
 if __name__ == "__main__":
     fetcher = MomentsFetcher()
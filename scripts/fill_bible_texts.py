@@ -5,16 +5,22 @@ Uses the Bible API to fetch verse texts
 """
 import json
 import os
-import requests
 import re
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from http_cache import HttpCache
+from http_transport import open_transport
+from moments_reader import MomentsReader
+from moments_stream import MomentsWriter, iter_moments
 
 class BibleTextFiller:
-    def __init__(self):
+    def __init__(self, moments_file: Optional[str] = None):
 
         # Auto-detect path: if running from scripts/ dir, go up one level; otherwise use current dir
-        if os.path.basename(os.getcwd()) == 'scripts':
+        if moments_file:
+            self.moments_file = moments_file  # A user's partition (see fetch_moments.partition_file)
+        elif os.path.basename(os.getcwd()) == 'scripts':
             self.moments_file = "../moments.json"  # From scripts/ directory
         else:
             self.moments_file = "moments.json"  # From root directory (GitHub Actions)
@@ -22,6 +28,14 @@ class BibleTextFiller:
         # Using Fetch Bible API with French SBL translation
         self.bible_api_base = "https://v1.fetch.bible/bibles/fra_sbl"
         
+        # Books are cached on disk (revalidated with conditional requests) and parsed once per run
+        self.http_cache = HttpCache()
+        self.http = open_transport()
+        self._books = {}
+        # Books actually downloaded from fetch.bible (not memoized, 304 or replayed);
+        # the politeness delays below only apply to those
+        self._live_fetches = 0
+        
     def usfm_to_fetch_bible_format(self, usfm: str) -> tuple:
         """Convert USFM format to Fetch Bible API format"""
         # Examples:
@@ -42,6 +56,24 @@ class BibleTextFiller:
             
         return None
         
+    def fetch_book_contents(self, book_code: str) -> tuple:
+        """Return (contents, status_code) for a whole book, contents is None on failure"""
+        if book_code in self._books:
+            return self._books[book_code], 200
+            
+        # Fetch the whole book in JSON format
+        url = f"{self.bible_api_base}/txt/{book_code}.json"
+        
+        response = self.http_cache.get(self.http, url, store_body=True, timeout=15)
+        if not response.not_modified and self.http.mode != 'replay':
+            self._live_fetches += 1
+        if response.status_code != 200:
+            return None, response.status_code
+            
+        contents = response.json().get('contents', [])
+        self._books[book_code] = contents
+        return contents, 200
+        
     def fetch_verse_text(self, usfm: str) -> str:
         """Fetch verse text from Fetch Bible API"""
         try:
@@ -51,14 +83,8 @@ class BibleTextFiller:
                 
             book_code, chapter, verse = api_format
             
-            # Fetch the whole book in JSON format
-            url = f"{self.bible_api_base}/txt/{book_code}.json"
-            
-            response = requests.get(url, timeout=15)
-            if response.status_code == 200:
-                data = response.json()
-                contents = data.get('contents', [])
-                
+            contents, status_code = self.fetch_book_contents(book_code)
+            if contents is not None:
                 # Structure: contents[chapter][verse]
                 # Both chapter and verse are 1-indexed in the API structure
                 if len(contents) > chapter:
@@ -88,7 +114,7 @@ class BibleTextFiller:
                         elif isinstance(verse_content, str):
                             return verse_content.strip()
             
-            print(f"  ⚠️ Could not find {usfm} (API response {response.status_code})")
+            print(f"  ⚠️ Could not find {usfm} (API response {status_code})")
             
         except Exception as e:
             print(f"Error fetching {usfm}: {e}")
@@ -96,64 +122,67 @@ class BibleTextFiller:
         return ""
         
     def fill_bible_texts(self):
-        """Fill all empty human_text fields in moments.json"""
+        """Fill all empty human_text fields in moments.json (streamed, one moment at a time)"""
         try:
-            with open(self.moments_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            total = len(MomentsReader(self.moments_file))
         except Exception as e:
             print(f"Error loading moments.json: {e}")
             return
             
-        moments = data.get('moments', [])
         updated_count = 0
         
-        print(f"Processing {len(moments)} moments...")
-        
-        for i, moment in enumerate(moments):
-            references = moment.get('references', [])
-            
-            for ref in references:
-                if ref.get('human_text') == '':  # Only fill empty texts
-                    usfm_list = ref.get('usfm', [])
-                    if usfm_list and len(usfm_list) > 0:
-                        
-                        print(f"Fetching text for {ref.get('human', 'verses')}...")
-                        
-                        # Fetch all verses in the range
-                        verse_texts = []
-                        for usfm in usfm_list:
-                            verse_text = self.fetch_verse_text(usfm)
-                            if verse_text:
-                                verse_texts.append(verse_text)
-                            
-                            # Small delay to be respectful to the API
-                            time.sleep(0.3)
-                        
-                        if verse_texts:
-                            # Combine all verses with appropriate spacing
-                            combined_text = ' '.join(verse_texts)
-                            ref['human_text'] = combined_text
-                            updated_count += 1
-                            print(f"  ✅ Added: {combined_text[:60]}...")
-                        else:
-                            print(f"  ❌ Could not fetch text for {usfm_list}")
-                        
-                        # Additional delay between references
-                        time.sleep(0.2)
-            
-            # Progress indicator
-            if (i + 1) % 10 == 0:
-                print(f"Progress: {i + 1}/{len(moments)} moments processed")
-        
-        print(f"\\nUpdated {updated_count} verse texts")
+        print(f"Processing {total} moments...")
         
-        # Save updated data
         try:
-            with open(self.moments_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            print(f"✅ Updated moments.json with Bible texts")
+            with MomentsWriter(self.moments_file) as writer:
+                # One moment at a time: each is written back as soon as it is filled
+                for i, moment in enumerate(iter_moments(self.moments_file, writer.metadata)):
+                    references = moment.get('references', [])
+                    
+                    for ref in references:
+                        if ref.get('human_text') == '':  # Only fill empty texts
+                            usfm_list = ref.get('usfm', [])
+                            if usfm_list and len(usfm_list) > 0:
+                                
+                                print(f"Fetching text for {ref.get('human', 'verses')}...")
+                                
+                                # Fetch all verses in the range
+                                verse_texts = []
+                                reference_fetches = self._live_fetches
+                                for usfm in usfm_list:
+                                    verse_fetches = self._live_fetches
+                                    verse_text = self.fetch_verse_text(usfm)
+                                    if verse_text:
+                                        verse_texts.append(verse_text)
+                                    
+                                    # Small delay to be respectful to the API
+                                    if self._live_fetches > verse_fetches:
+                                        time.sleep(0.3)
+                                
+                                if verse_texts:
+                                    # Combine all verses with appropriate spacing
+                                    combined_text = ' '.join(verse_texts)
+                                    ref['human_text'] = combined_text
+                                    updated_count += 1
+                                    print(f"  ✅ Added: {combined_text[:60]}...")
+                                else:
+                                    print(f"  ❌ Could not fetch text for {usfm_list}")
+                                
+                                # Additional delay between references
+                                if self._live_fetches > reference_fetches:
+                                    time.sleep(0.2)
+                    
+                    writer.write(moment)
+                    
+                    # Progress indicator
+                    if (i + 1) % 10 == 0:
+                        print(f"Progress: {i + 1}/{total} moments processed")
         except Exception as e:
-            print(f"Error saving updated data: {e}")
+            print(f"Error updating moments.json: {e}")
+            return
+        
+        print(f"\\nUpdated {updated_count} verse texts")
+        print(f"✅ Updated moments.json with Bible texts")
 
 def main():
     filler = BibleTextFiller()
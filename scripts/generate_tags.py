@@ -6,16 +6,23 @@ import json
 import requests
 from datetime import datetime, timezone
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional
 from dotenv import load_dotenv
 
+from http_transport import open_transport
+from moments_reader import MomentsReader
+from moments_stats import MomentsStats
+from moments_stream import MomentsWriter, iter_moments
+
 class TagsGenerator:
-    def __init__(self):
+    def __init__(self, moments_file: Optional[str] = None):
         # Load environment variables
         load_dotenv()
         
         # Auto-detect path: if running from scripts/ dir, go up one level
-        if os.path.basename(os.getcwd()) == 'scripts':
+        if moments_file:
+            self.moments_file = moments_file  # A user's partition (see fetch_moments.partition_file)
+        elif os.path.basename(os.getcwd()) == 'scripts':
             self.moments_file = "../moments.json"
         else:
             self.moments_file = "moments.json"
@@ -32,8 +39,12 @@ class TagsGenerator:
             "API-KEY": api_key,
             "Content-Type": "application/json"
         }
+        self.http = open_transport()
         
+        # Top-level fields of moments.json; moments themselves are streamed
         self.moments_data = {}
+        self.total_moments = 0
+        self.stats = None
         
         # Predefined tags with descriptions
         self.predefined_tags = [
@@ -83,13 +94,17 @@ class TagsGenerator:
         ]
         
     def load_existing_data(self):
-        """Load existing moments"""
+        """Load moments metadata (moments are streamed by process_all_moments)"""
         try:
             if os.path.exists(self.moments_file):
-                with open(self.moments_file, 'r', encoding='utf-8') as f:
-                    self.moments_data = json.load(f)
-                    print(f"Loaded {len(self.moments_data.get('moments', []))} moments")
-                    return True
+                reader = MomentsReader(self.moments_file)
+                self.moments_data = dict(reader.metadata)
+                self.total_moments = len(reader)
+                self.stats = MomentsStats.from_dict(self.moments_data.get('stats'))
+                if self.stats is None:
+                    self.stats = MomentsStats.from_moments(iter_moments(self.moments_file))
+                print(f"Loaded {self.total_moments} moments")
+                return True
             else:
                 print("No moments file found")
                 return False
@@ -146,7 +161,7 @@ Rien d'autre dans la réponse. Pas de bloc de code."""
     def call_ai_api(self, payload: Dict) -> Optional[List[str]]:
         """Call the 1min.ai API and extract tags"""
         try:
-            response = requests.post(self.api_url, headers=self.headers, json=payload, timeout=30)
+            response = self.http.post(self.api_url, headers=self.headers, json=payload, timeout=30)
             response.raise_for_status()
             
             # The API returns JSON directly
@@ -209,26 +224,22 @@ Rien d'autre dans la réponse. Pas de bloc de code."""
         return valid_tags
         
     def process_all_moments(self):
-        """Process all moments and generate tags"""
-        moments = self.moments_data.get('moments', [])
-        updated_moments = []
-        used_tags = set()
-        
-        print(f"Processing {len(moments)} moments...")
+        """Process all moments and generate tags, yielding them one at a time"""
+        print(f"Processing {self.total_moments} moments...")
         
-        for i, moment in enumerate(moments):
-            print(f"Processing moment {i+1}/{len(moments)}...")
+        # One moment at a time: each is written back as soon as it is processed
+        for i, moment in enumerate(iter_moments(self.moments_file)):
+            print(f"Processing moment {i+1}/{self.total_moments}...")
             
             # Skip if moment already has tags (optional: you could force regeneration)
             current_tags = moment.get('tag', '')
             if current_tags and current_tags != '':
                 if isinstance(current_tags, list):
                     tag_names = [tag.get('name', tag) if isinstance(tag, dict) else tag for tag in current_tags]
-                    used_tags.update(tag_names)
                     print(f"  Skipping - already has tags: {tag_names}")
                 else:
                     print(f"  Skipping - already has tags: {current_tags}")
-                updated_moments.append(moment)
+                yield moment
                 continue
             
             # Generate tags
@@ -236,30 +247,29 @@ Rien d'autre dans la réponse. Pas de bloc de code."""
             
             if generated_tags:
                 # Update moment with generated tags (simple list)
+                self.stats.update_tags(current_tags, generated_tags)
                 moment['tag'] = generated_tags
-                used_tags.update(generated_tags)
                 print(f"  Generated {len(generated_tags)} tags: {generated_tags}")
             else:
                 print(f"  No tags generated")
                 moment['tag'] = []
                 
-            updated_moments.append(moment)
-            
-        return updated_moments, list(used_tags)
+            yield moment
         
-    def save_data(self, updated_moments: List[Dict], used_tags: List[str]):
-        """Save updated moments with tags information"""
-        
-        # Update moments data
-        self.moments_data['moments'] = updated_moments
-        self.moments_data['last_tag_update'] = datetime.now(timezone.utc).isoformat()
-        self.moments_data['tags_used'] = sorted(used_tags)
-        self.moments_data['total_tags_available'] = len(self.predefined_tags)
-        
-        # Save updated moments
+    def save_data(self, updated_moments: Iterable[Dict]):
+        """Stream updated moments to disk, then save tags information"""
         try:
-            with open(self.moments_file, 'w', encoding='utf-8') as f:
-                json.dump(self.moments_data, f, indent=2, ensure_ascii=False)
+            with MomentsWriter(self.moments_file) as writer:
+                for moment in updated_moments:
+                    writer.write(moment)
+                    
+                # Tags used come from the stats, complete once every moment went through
+                used_tags = self.stats.tags_used
+                self.moments_data['last_tag_update'] = datetime.now(timezone.utc).isoformat()
+                self.moments_data['tags_used'] = used_tags
+                self.moments_data['stats'] = self.stats.to_dict()
+                self.moments_data['total_tags_available'] = len(self.predefined_tags)
+                writer.metadata.update(self.moments_data)
             print(f"Updated moments saved to {self.moments_file}")
             print(f"Tags used: {sorted(used_tags)}")
             print(f"Total tags available: {len(self.predefined_tags)}")
@@ -289,11 +299,8 @@ Rien d'autre dans la réponse. Pas de bloc de code."""
             print("\n🆕 First run detected!")
             self.display_available_tags()
             
-        # Process all moments
-        updated_moments, used_tags = self.process_all_moments()
-        
-        # Save results
-        self.save_data(updated_moments, used_tags)
+        # Process all moments and save results as they are tagged
+        self.save_data(self.process_all_moments())
         
         print("\n✅ AI tags generation completed!")
         
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Persistent HTTP cache with conditional requests for the pipeline's GET clients
+
+For each URL (+ query params) the cache keeps the ETag / Last-Modified
+validators and a SHA-256 digest of the body, and optionally the body itself:
+- later requests send If-None-Match / If-Modified-Since
+- a 304, or a 200 whose body has the same digest, is reported as
+  `not_modified` before anything is parsed
+- with store_body=True (immutable resources like fetch.bible books) a 304 is
+  answered from the cached body
+
+Entries live in .http_cache/ at the repository root, one small JSON file
+(+ optional body file) per URL. Auth headers are never stored. Transports
+with `caching = False` (record/replay, see http_transport) bypass the cache.
+
+With defer=True an entry is only kept in memory until commit(): callers
+that turn responses into stored state (YouVersion pages -> moments.json)
+commit once that state is saved, so a run that dies in between does not
+leave validators that would answer the next run with a 304.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / '.http_cache'
+
+
+class CachedResponse:
+    """Subset of requests.Response used by the pipeline, plus `not_modified`"""
+
+    def __init__(self, status_code: int, content: Optional[bytes], not_modified: bool = False,
+                 response=None):
+        self.status_code = status_code
+        self.content = content
+        self.not_modified = not_modified
+        self._response = response
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8') if self.content is not None else ''
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        # 304 is only a failure if we had nothing cached to answer with
+        if self._response is not None and self.status_code != 304:
+            self._response.raise_for_status()
+
+
+class HttpCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self._pending: Dict[Path, tuple] = {}  # meta_file -> (body_file, entry, content), see defer
+        self._lock = threading.Lock()
+
+    def _paths(self, url: str, params: Optional[Dict]):
+        query = json.dumps(sorted((params or {}).items()), default=str)
+        key = hashlib.sha1(f"{url}?{query}".encode('utf-8')).hexdigest()
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.body"
+
+    def _load_entry(self, meta_file: Path) -> Optional[Dict]:
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_entry(self, meta_file: Path, body_file: Path, entry: Dict, content: Optional[bytes]):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        if content is not None:
+            tmp_body = body_file.with_name(body_file.name + '.tmp')
+            with open(tmp_body, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_body, body_file)
+        tmp_meta = meta_file.with_name(meta_file.name + '.tmp')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_meta, meta_file)
+
+    def get(self, http, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+            store_body: bool = False, conditional: bool = True, defer: bool = False,
+            **kwargs) -> CachedResponse:
+        """GET through `http` (requests, a Session or an HttpTransport) with cache validation
+
+        conditional=False skips the validators (e.g. when the caller lost the
+        state built from earlier responses) but still refreshes the entry.
+        defer=True keeps the refreshed entry in memory until commit().
+        """
+        caching = getattr(http, 'caching', True)
+        meta_file, body_file = self._paths(url, params)
+        entry = self._load_entry(meta_file) if conditional and caching else None
+        if entry and store_body and not body_file.exists():
+            entry = None
+
+        request_headers = dict(headers or {})
+        if entry:
+            if entry.get('etag'):
+                request_headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                request_headers['If-Modified-Since'] = entry['last_modified']
+
+        response = http.get(url, params=params, headers=request_headers, **kwargs)
+
+        if response.status_code == 304 and entry:
+            if store_body:
+                with open(body_file, 'rb') as f:
+                    return CachedResponse(200, f.read(), not_modified=True, response=response)
+            return CachedResponse(304, None, not_modified=True, response=response)
+
+        if response.status_code != 200 or not caching:
+            return CachedResponse(response.status_code, response.content, response=response)
+
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        unchanged = bool(entry) and entry.get('digest') == digest
+
+        new_entry = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'digest': digest
+        }
+        if defer:
+            with self._lock:
+                self._pending[meta_file] = (body_file, new_entry, content if store_body else None)
+        else:
+            self._write(meta_file, body_file, new_entry, content if store_body else None)
+
+        return CachedResponse(200, content, not_modified=unchanged, response=response)
+
+    def _write(self, meta_file: Path, body_file: Path, entry: Dict, content: Optional[bytes]):
+        try:
+            self._save_entry(meta_file, body_file, entry, content)
+        except OSError as e:
+            print(f"⚠️ Could not write HTTP cache entry for {entry['url']}: {e}")
+
+    def commit(self):
+        """Write the entries kept back by defer=True"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for meta_file, (body_file, entry, content) in pending.items():
+            self._write(meta_file, body_file, entry, content)
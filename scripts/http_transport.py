@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP transport with record/replay cassettes
+
+Every outbound request of the pipeline (YouVersion, fetch.bible, 1min.ai,
+ntfy) goes through HttpTransport, which has three modes:
+- live (default): plain requests / requests.Session
+- record: live requests, and each response is saved as a cassette
+- replay: responses come from the cassettes only, nothing touches the network
+
+Cassettes live in .http_cassettes/<host>/<key>.json at the repository root,
+keyed by method + URL + query params + body. Request headers (tokens) are
+never stored. Repeated identical requests are replayed in recording order.
+
+In replay mode a latency profile is injected per request:
+- none (default): full speed
+- recorded: the latency observed while recording
+- 0.2: a fixed delay in seconds
+- moments.youversionapi.com=0.3,*=0.05: per host, `*` for the others
+
+Configuration (environment): HTTP_TRANSPORT_MODE, HTTP_CASSETTE_DIR,
+HTTP_REPLAY_LATENCY.
+
+Usage:
+    python http_transport.py                     # Cassettes summary
+    python http_transport.py --pipeline record   # Full pipeline on a copy of the archive
+    python http_transport.py --pipeline replay --latency recorded
+"""
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+MODES = ('live', 'record', 'replay')
+DEFAULT_CASSETTE_DIR = Path(__file__).resolve().parent.parent / '.http_cassettes'
+
+# Response headers kept in cassettes (HttpCache validators and content type)
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class LatencyProfile:
+    """Delay injected before each replayed response"""
+
+    def __init__(self, value: Optional[str] = None):
+        self.value = (value or 'none').strip()
+        self.recorded = self.value == 'recorded'
+        self.delays: Dict[str, float] = {}
+        if self.value in ('none', 'recorded'):
+            return
+        for item in self.value.split(','):
+            host, _, delay = item.rpartition('=')
+            self.delays[host.strip() or '*'] = float(delay)
+
+    def delay(self, host: str, recorded_elapsed: float) -> float:
+        if self.recorded:
+            return recorded_elapsed
+        return self.delays.get(host, self.delays.get('*', 0.0))
+
+
+class RecordedResponse:
+    """Subset of requests.Response rebuilt from a cassette"""
+
+    def __init__(self, method: str, url: str, status_code: int, content: bytes, headers: Dict[str, str]):
+        from requests.structures import CaseInsensitiveDict
+
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        import requests
+
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url} (replayed)", response=self)
+
+
+def _encode_body(content: bytes) -> Dict:
+    try:
+        return {'encoding': 'utf-8', 'body': content.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'encoding': 'base64', 'body': base64.b64encode(content).decode('ascii')}
+
+
+def _decode_body(interaction: Dict) -> bytes:
+    if interaction.get('encoding') == 'base64':
+        return base64.b64decode(interaction['body'])
+    return interaction['body'].encode('utf-8')
+
+
+class Cassettes:
+    """On-disk store of recorded interactions, shared by every transport of a process"""
+
+    _open: Dict[Path, 'Cassettes'] = {}
+    _open_lock = threading.Lock()
+
+    @classmethod
+    def open(cls, cassette_dir=DEFAULT_CASSETTE_DIR) -> 'Cassettes':
+        cassette_dir = Path(cassette_dir).resolve()
+        with cls._open_lock:
+            if cassette_dir not in cls._open:
+                cls._open[cassette_dir] = cls(cassette_dir)
+            return cls._open[cassette_dir]
+
+    def __init__(self, cassette_dir):
+        self.cassette_dir = Path(cassette_dir)
+        self._lock = threading.Lock()
+        self._recorded: Dict[str, Dict] = {}   # Cassettes written by this process
+        self._replayed: Dict[str, int] = {}    # Next interaction to replay per key
+
+    @staticmethod
+    def request_key(method: str, url: str, params: Optional[Dict], json_body=None, data=None) -> str:
+        body = ''
+        if json_body is not None:
+            body = json.dumps(json_body, sort_keys=True, ensure_ascii=False)
+        elif data is not None:
+            raw = data if isinstance(data, bytes) else str(data).encode('utf-8')
+            body = hashlib.sha256(raw).hexdigest()
+        query = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        text = json.dumps([method.upper(), url, query, body], ensure_ascii=False)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _path(self, url: str, key: str) -> Path:
+        host = urlparse(url).netloc or 'local'
+        return self.cassette_dir / host / f"{key}.json"
+
+    def record(self, key: str, method: str, url: str, params: Optional[Dict], response, elapsed: float):
+        interaction = {
+            'status_code': response.status_code,
+            'headers': {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            'elapsed': round(elapsed, 4),
+            **_encode_body(response.content)
+        }
+        path = self._path(url, key)
+        with self._lock:
+            # The first recording of a key in this run replaces the previous cassette
+            cassette = self._recorded.setdefault(key, {
+                'method': method.upper(),
+                'url': url,
+                'params': {str(k): str(v) for k, v in (params or {}).items()},
+                'interactions': []
+            })
+            cassette['interactions'].append(interaction)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = path.with_name(path.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(cassette, f, ensure_ascii=False)
+            os.replace(tmp_file, path)
+
+    def replay(self, key: str, url: str) -> Optional[Dict]:
+        """Next recorded interaction for `key` (the last one repeats), None if never recorded"""
+        try:
+            with open(self._path(url, key), 'r', encoding='utf-8') as f:
+                interactions = json.load(f)['interactions']
+        except (OSError, ValueError, KeyError):
+            return None
+        if not interactions:
+            return None
+        with self._lock:
+            position = self._replayed.get(key, 0)
+            self._replayed[key] = position + 1
+        return interactions[min(position, len(interactions) - 1)]
+
+    def summary(self) -> Dict[str, Dict]:
+        """Per host: cassettes, interactions and recorded latency"""
+        hosts = {}
+        if not self.cassette_dir.exists():
+            return hosts
+        for path in sorted(self.cassette_dir.glob('*/*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    interactions = json.load(f)['interactions']
+            except (OSError, ValueError, KeyError):
+                continue
+            host = hosts.setdefault(path.parent.name, {'cassettes': 0, 'interactions': 0, 'elapsed': 0.0})
+            host['cassettes'] += 1
+            host['interactions'] += len(interactions)
+            host['elapsed'] += sum(interaction.get('elapsed', 0.0) for interaction in interactions)
+        return hosts
+
+
+class HttpTransport:
+    """requests-compatible get/post with record/replay
+
+    `http` is what live requests go through: the requests module (default)
+    or a shared requests.Session.
+    """
+
+    def __init__(self, http=None, mode: Optional[str] = None, cassette_dir=None,
+                 latency: Optional[str] = None):
+        self.mode = (mode or os.getenv('HTTP_TRANSPORT_MODE') or 'live').lower()
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown HTTP_TRANSPORT_MODE '{self.mode}' (expected one of {', '.join(MODES)})")
+        self._http = http
+        self.cassettes = Cassettes.open(cassette_dir or os.getenv('HTTP_CASSETTE_DIR') or DEFAULT_CASSETTE_DIR)
+        self.latency = LatencyProfile(latency or os.getenv('HTTP_REPLAY_LATENCY'))
+        # Recorded/replayed runs bypass HttpCache so cassettes always hold full bodies
+        self.caching = self.mode == 'live'
+
+    @property
+    def http(self):
+        if self._http is None:
+            import requests
+            self._http = requests
+        return self._http
+
+    def get(self, url: str, params: Optional[Dict] = None, **kwargs):
+        return self.request('GET', url, params=params, **kwargs)
+
+    def post(self, url: str, data=None, json=None, **kwargs):
+        return self.request('POST', url, data=data, json=json, **kwargs)
+
+    def request(self, method: str, url: str, params: Optional[Dict] = None, data=None, json=None, **kwargs):
+        if self.mode == 'live':
+            return self.http.request(method, url, params=params, data=data, json=json, **kwargs)
+
+        key = Cassettes.request_key(method, url, params, json, data)
+
+        if self.mode == 'replay':
+            interaction = self.cassettes.replay(key, url)
+            if interaction is None:
+                import requests
+                raise requests.ConnectionError(f"No recorded response for {method} {url} (replay mode)")
+            delay = self.latency.delay(urlparse(url).netloc, interaction.get('elapsed', 0.0))
+            if delay > 0:
+                time.sleep(delay)
+            return RecordedResponse(method, url, interaction['status_code'], _decode_body(interaction),
+                                    interaction.get('headers', {}))
+
+        start = time.perf_counter()
+        response = self.http.request(method, url, params=params, data=data, json=json, **kwargs)
+        self.cassettes.record(key, method, url, params, response, time.perf_counter() - start)
+        return response
+
+
+def open_transport(http=None) -> HttpTransport:
+    """Transport configured from the environment (an existing transport is returned as is)"""
+    if isinstance(http, HttpTransport):
+        return http
+    return HttpTransport(http)
+
+
+# -- pipeline runs --
+
+def run_pipeline(mode: str, moments_file, latency: Optional[str] = None):
+    """Run fetch -> fill -> tags -> indexes -> exports on a temporary copy of the archive
+
+    The derived files (snapshot, indexes, exports) are copied along with
+    moments.json, so a replay measures the same incremental updates as a
+    nightly run instead of full rebuilds.
+    """
+    import shutil
+    import tempfile
+
+    os.environ['HTTP_TRANSPORT_MODE'] = mode
+    if latency:
+        os.environ['HTTP_REPLAY_LATENCY'] = latency
+    if mode == 'replay':
+        # Credentials are never recorded, any value replays
+        os.environ.setdefault('YOUVERSION_BEARER_TOKEN', 'replay')
+        os.environ.setdefault('ONEMIN_AI_API_KEY', 'replay')
+
+    from fetch_moments import MomentsFetcher
+
+    moments_file = Path(moments_file)
+    derived = [moments_file.with_suffix('.jsonl'), moments_file.with_name('moments_index.json'),
+               *sorted(moments_file.parent.glob('moments_vectors.*'))]
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # copy2 keeps mtimes, so legacy snapshots are still recognised as fresh
+        shutil.copy2(moments_file, Path(tmp_dir) / 'moments.json')
+        for path in derived:
+            if path.is_file():
+                shutil.copy2(path, Path(tmp_dir) / path.name)
+        exports = moments_file.with_name('exports')
+        if exports.is_dir():
+            shutil.copytree(exports, Path(tmp_dir) / 'exports')
+        os.chdir(tmp_dir)
+        try:
+            start = time.perf_counter()
+            MomentsFetcher().run()
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    print(f"\n⏱️  Pipeline ({mode}, latency {LatencyProfile(latency or os.getenv('HTTP_REPLAY_LATENCY')).value}): {elapsed:.2f}s")
+
+
+def main():
+    args = sys.argv[1:]
+    if '--pipeline' in args:
+        from moments_reader import DEFAULT_MOMENTS_FILE
+
+        mode = args[args.index('--pipeline') + 1]
+        if mode not in ('record', 'replay'):
+            print("❌ --pipeline expects record or replay")
+            sys.exit(1)
+        latency = args[args.index('--latency') + 1] if '--latency' in args else None
+        moments_file = args[args.index('--archive') + 1] if '--archive' in args else DEFAULT_MOMENTS_FILE
+        run_pipeline(mode, moments_file, latency)
+        return
+
+    cassettes = Cassettes.open(os.getenv('HTTP_CASSETTE_DIR') or DEFAULT_CASSETTE_DIR)
+    hosts = cassettes.summary()
+    if not hosts:
+        print(f"📼 No cassettes in {cassettes.cassette_dir}")
+        return
+    print(f"📼 Cassettes in {cassettes.cassette_dir}")
+    for host, summary in hosts.items():
+        print(f"  {host}: {summary['interactions']} responses in {summary['cassettes']} cassettes, "
+              f"{summary['elapsed']:.2f}s recorded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Stable identity of moments
+
+Moments have no id in moments.json. The search index, the similarity index
+and the exports all refer to moments by the key computed here, so the keys
+must be produced by this module only.
+
+Only the standard library is used, like moments_reader.
+"""
+import hashlib
+from typing import Dict, Iterable, Iterator, Tuple
+
+
+def moment_key(moment: Dict) -> str:
+    """Stable identity of a moment dict: its content and referenced verses
+
+    This key survives text filling and tagging, which only touch human_text
+    and tag.
+    """
+    usfm = '|'.join(','.join(ref.get('usfm', [])) for ref in moment.get('references', []))
+    digest = hashlib.sha1(f"{moment.get('content', '')}\x1f{usfm}".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def iter_keyed_moments(moments: Iterable[Dict]) -> Iterator[Tuple[str, Dict]]:
+    """(key, moment) in archive order, with keys unique across the archive
+
+    Identical moments (e.g. two empty highlights on one verse) share a
+    moment_key; the second one gets `key#1`, the third `key#2`, and so on.
+    """
+    seen = set()
+    for moment in moments:
+        key = base_key = moment_key(moment)
+        n = 1
+        while key in seen:
+            key = f"{base_key}#{n}"
+            n += 1
+        seen.add(key)
+        yield key, moment
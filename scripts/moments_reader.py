@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Lightweight, dependency-free reader for moments data
+
+Consumers that only query the archive (send_verse, dashboards, ...) should use
+this module instead of the fetch/fill/tag scripts: it needs no credentials, no
+network libraries and only imports the standard library on demand.
+
+Reads go through a compact snapshot (moments.jsonl) written next to
+moments.json:
+- line 1: a header with the metadata, the record count and the identity
+  (size and generation) of the moments.json it was built from
+- line 2: the byte offset of each record, as fixed-width hex
+- then one minified moment per line
+so the first record (or any random one) is two small reads + json.loads
+away, whatever the size of the archive. If the snapshot is missing or out of
+date, the reader falls back to streaming moments.json (see moments_stream),
+which is slower but still constant-memory.
+
+Every writer of moments.json stamps a random `generation` as its last
+top-level key (stamp_generation). It survives checkouts and copies, unlike
+the mtime, so a snapshot is checked against moments.json by reading the last
+few KB of the file instead of hashing all of it. Files written before
+generations existed fall back to the mtime, then the SHA-256 of the content.
+"""
+import os
+import re
+import sys
+from pathlib import Path
+
+SNAPSHOT_FORMAT = "moments-snapshot"
+SNAPSHOT_VERSION = 3
+OFFSET_WIDTH = 12  # Hex digits per offset
+
+GENERATION_KEY = 'generation'
+GENERATION_TAIL_BYTES = 4096  # The generation is the last key of moments.json
+_GENERATION_TAIL = re.compile(rb'"generation":\s*"([0-9a-f]+)"\s*\}\s*$')
+
+_ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_MOMENTS_FILE = _ROOT_DIR / 'moments.json'
+
+
+def snapshot_path_for(moments_file) -> Path:
+    """Return the snapshot path matching a moments.json path"""
+    return Path(moments_file).with_suffix('.jsonl')
+
+
+def file_digest(path) -> str:
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stamp_generation(data: dict) -> dict:
+    """Give the moments.json document a new generation, as its last key"""
+    data.pop(GENERATION_KEY, None)
+    data[GENERATION_KEY] = os.urandom(8).hex()
+    return data
+
+
+def read_generation(moments_file):
+    """Generation of moments.json from the end of the file, None for files written without one"""
+    with open(moments_file, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - GENERATION_TAIL_BYTES))
+        match = _GENERATION_TAIL.search(f.read())
+    return match.group(1).decode('ascii') if match else None
+
+
+def source_identity(moments_file, generation=None) -> dict:
+    """What the snapshot header records about moments.json to detect stale snapshots"""
+    stat = Path(moments_file).stat()
+    if generation:
+        return {'source_size': stat.st_size, GENERATION_KEY: generation}
+    return {
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_sha256': file_digest(moments_file)
+    }
+
+
+class SnapshotWriter:
+    """Write the snapshot one moment at a time
+
+    Records go to a temporary file while their offsets are collected; close()
+    then writes the header, the offset table and the records. close() must be
+    called after moments.json itself has been written, since the header
+    records its identity to detect stale snapshots.
+    """
+
+    def __init__(self, moments_file=DEFAULT_MOMENTS_FILE, snapshot_file=None):
+        self.moments_file = Path(moments_file)
+        self.snapshot_file = Path(snapshot_file) if snapshot_file else snapshot_path_for(self.moments_file)
+        self._records_file = self.snapshot_file.with_name(self.snapshot_file.name + '.records.tmp')
+        self._records = open(self._records_file, 'wb')
+        self._offsets = []
+        self._position = 0
+
+    def add(self, moment: dict):
+        import json
+
+        line = json.dumps(moment, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._offsets.append(self._position)
+        self._position += len(line)
+        self._records.write(line)
+
+    def close(self, meta: dict) -> Path:
+        import json
+        import shutil
+
+        self._records.close()
+        header = {
+            'format': SNAPSHOT_FORMAT,
+            'version': SNAPSHOT_VERSION,
+            'total_moments': len(self._offsets),
+            **(source_identity(self.moments_file, meta.get(GENERATION_KEY)) if self.moments_file.exists() else {}),
+            'meta': meta,
+        }
+
+        tmp_file = self.snapshot_file.with_name(self.snapshot_file.name + '.tmp')
+        with open(tmp_file, 'wb') as f, open(self._records_file, 'rb') as records:
+            f.write(json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+            f.write(''.join(f"{offset:0{OFFSET_WIDTH}x}" for offset in self._offsets).encode('ascii') + b'\n')
+            shutil.copyfileobj(records, f)
+        os.replace(tmp_file, self.snapshot_file)
+        os.remove(self._records_file)
+        return self.snapshot_file
+
+    def abort(self):
+        self._records.close()
+        try:
+            os.remove(self._records_file)
+        except OSError:
+            pass
+
+
+def write_snapshot(data: dict, moments_file=DEFAULT_MOMENTS_FILE, snapshot_file=None) -> Path:
+    """Write the compact snapshot for `data` (the full moments.json document)
+
+    Must be called after moments.json itself has been written.
+    """
+    writer = SnapshotWriter(moments_file, snapshot_file)
+    for moment in data.get('moments', []):
+        writer.add(moment)
+    return writer.close({k: v for k, v in data.items() if k != 'moments'})
+
+
+class MomentsReader:
+    """Read-only, sequence-like access to the moments archive
+
+    Supports len(), iteration and indexing, so random.choice(reader) works.
+    """
+
+    def __init__(self, moments_file=DEFAULT_MOMENTS_FILE, snapshot_file=None):
+        self.moments_file = Path(moments_file)
+        self.snapshot_file = Path(snapshot_file) if snapshot_file else snapshot_path_for(self.moments_file)
+
+        self._header = None
+        self._offsets_start = 0
+        self._records_start = 0
+        # Only used when falling back to streaming moments.json
+        self._metadata = None
+        self._length = None
+
+        self._open_snapshot()
+
+    def _open_snapshot(self) -> bool:
+        """Read the snapshot header if the snapshot matches moments.json"""
+        import json
+
+        try:
+            with open(self.snapshot_file, 'rb') as f:
+                header_line = f.readline()
+        except OSError:
+            return False
+
+        try:
+            header = json.loads(header_line)
+        except ValueError:
+            return False
+
+        if header.get('format') != SNAPSHOT_FORMAT or header.get('version') != SNAPSHOT_VERSION:
+            return False
+
+        # moments.json rewritten without refreshing the snapshot -> stale.
+        # The generation at the end of moments.json decides; legacy files
+        # without one are checked by mtime, then by content digest.
+        try:
+            stat = self.moments_file.stat()
+        except OSError:
+            stat = None
+        if stat is not None:
+            if stat.st_size != header.get('source_size'):
+                return False
+            try:
+                generation = read_generation(self.moments_file)
+                if generation:
+                    if generation != header.get(GENERATION_KEY):
+                        return False
+                elif stat.st_mtime_ns != header.get('source_mtime_ns'):
+                    if file_digest(self.moments_file) != header.get('source_sha256'):
+                        return False
+            except OSError:
+                return False
+
+        self._header = header
+        self._offsets_start = len(header_line)
+        self._records_start = self._offsets_start + OFFSET_WIDTH * header['total_moments'] + 1
+        return True
+
+    def _scan(self):
+        """Fallback: one streaming pass over moments.json for metadata and length"""
+        from moments_stream import iter_moments
+
+        metadata = {}
+        length = 0
+        for _ in iter_moments(self.moments_file, metadata):
+            length += 1
+        self._metadata = metadata
+        self._length = length
+
+    @property
+    def uses_snapshot(self) -> bool:
+        return self._header is not None
+
+    @property
+    def metadata(self) -> dict:
+        """Top-level fields of moments.json except the moments list"""
+        if self._header is not None:
+            return self._header.get('meta', {})
+        if self._metadata is None:
+            self._scan()
+        return self._metadata
+
+    def __len__(self) -> int:
+        if self._header is not None:
+            return self._header['total_moments']
+        if self._length is None:
+            self._scan()
+        return self._length
+
+    def __getitem__(self, index: int) -> dict:
+        if self._header is None:
+            if index < 0:
+                index += len(self)
+            if index >= 0:
+                for position, moment in enumerate(self):
+                    if position == index:
+                        return moment
+            raise IndexError("moment index out of range")
+
+        import json
+
+        total = self._header['total_moments']
+        if index < 0:
+            index += total
+        if not 0 <= index < total:
+            raise IndexError("moment index out of range")
+        with open(self.snapshot_file, 'rb') as f:
+            f.seek(self._offsets_start + OFFSET_WIDTH * index)
+            offset = int(f.read(OFFSET_WIDTH), 16)
+            f.seek(self._records_start + offset)
+            return json.loads(f.readline())
+
+    def __iter__(self):
+        if self._header is None:
+            from moments_stream import iter_moments
+
+            yield from iter_moments(self.moments_file)
+            return
+
+        import json
+
+        with open(self.snapshot_file, 'rb') as f:
+            f.seek(self._records_start)
+            for line in f:
+                yield json.loads(line)
+
+
+def refresh_snapshot(moments_file=DEFAULT_MOMENTS_FILE) -> Path:
+    """Rebuild the snapshot from moments.json"""
+    import json
+
+    with open(moments_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return write_snapshot(data, moments_file)
+
+
+def main():
+    moments_file = DEFAULT_MOMENTS_FILE
+
+    if '--snapshot' in sys.argv:
+        snapshot_file = refresh_snapshot(moments_file)
+        print(f"✅ Snapshot written to {snapshot_file}")
+        return
+
+    reader = MomentsReader(moments_file)
+    source = reader.snapshot_file if reader.uses_snapshot else reader.moments_file
+    print(f"📚 {len(reader)} moments ({source})")
+    for key, value in reader.metadata.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Precomputed statistics over moments
+
+The `stats` block of moments.json holds counts per tag, color, book, month
+and tag pair. Stages update it when they add, change or delete moments, so
+neither they nor the dashboards have to rescan the archive. The block is
+also part of the snapshot header, so `python moments_stats.py` only reads
+one line.
+"""
+import sys
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional
+
+STAT_KEYS = ('tags', 'colors', 'books', 'months', 'tag_pairs')
+
+
+def tag_names(tags) -> List[str]:
+    """Tag names from a moment's `tag` field ('' when not tagged yet)"""
+    if not isinstance(tags, (list, tuple)):
+        return []
+    names = [tag.get('name') if isinstance(tag, dict) else tag for tag in tags]
+    return sorted(set(name for name in names if isinstance(name, str) and name))
+
+
+def moment_facets(moment: Dict) -> Dict[str, List[str]]:
+    """What a moment dict contributes to each counter"""
+    tags = tag_names(moment.get('tag', ''))
+    books = set()
+    for ref in moment.get('references', []):
+        for usfm in ref.get('usfm', []):
+            if isinstance(usfm, str) and '.' in usfm:
+                books.add(usfm.split('.')[0])
+    created_dt = moment.get('created_dt') or moment.get('_created_dt') or ''
+    return {
+        'tags': tags,
+        'colors': [moment['color']] if moment.get('color') else [],
+        'books': sorted(books),
+        'months': [created_dt[:7]] if len(created_dt) >= 7 else [],
+        'tag_pairs': [f"{a}+{b}" for a, b in combinations(tags, 2)]
+    }
+
+
+class MomentsStats:
+    """Counters maintained incrementally on add/remove"""
+
+    def __init__(self, counts: Optional[Dict[str, Dict[str, int]]] = None, total_moments: int = 0):
+        counts = counts or {}
+        self.counts = {key: dict(counts.get(key, {})) for key in STAT_KEYS}
+        self.total_moments = total_moments
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> Optional['MomentsStats']:
+        if not data:
+            return None
+        return cls(data, data.get('total_moments', 0))
+
+    @classmethod
+    def from_moments(cls, moments: Iterable[Dict]) -> 'MomentsStats':
+        """Full rebuild, only used when the archive has no stats block yet"""
+        stats = cls()
+        for moment in moments:
+            stats.add(moment)
+        return stats
+
+    def to_dict(self) -> Dict:
+        data = {'total_moments': self.total_moments}
+        for key in STAT_KEYS:
+            data[key] = dict(sorted(self.counts[key].items()))
+        return data
+
+    def _apply(self, facets: Dict[str, List[str]], delta: int):
+        for key, values in facets.items():
+            counter = self.counts[key]
+            for value in values:
+                count = counter.get(value, 0) + delta
+                if count > 0:
+                    counter[value] = count
+                else:
+                    counter.pop(value, None)
+
+    def add(self, moment: Dict):
+        self._apply(moment_facets(moment), 1)
+        self.total_moments += 1
+
+    def remove(self, moment: Dict):
+        self._apply(moment_facets(moment), -1)
+        self.total_moments -= 1
+
+    def update(self, old_moment: Dict, new_moment: Dict):
+        """Upsert: replace the contribution of old_moment by new_moment"""
+        self._apply(moment_facets(old_moment), -1)
+        self._apply(moment_facets(new_moment), 1)
+
+    def update_tags(self, old_tags, new_tags):
+        """Cheaper update when only a moment's `tag` field changed"""
+        old_names = tag_names(old_tags)
+        new_names = tag_names(new_tags)
+        self._apply({
+            'tags': old_names,
+            'tag_pairs': [f"{a}+{b}" for a, b in combinations(old_names, 2)]
+        }, -1)
+        self._apply({
+            'tags': new_names,
+            'tag_pairs': [f"{a}+{b}" for a, b in combinations(new_names, 2)]
+        }, 1)
+
+    @property
+    def colors_used(self) -> List[str]:
+        return sorted(self.counts['colors'])
+
+    @property
+    def tags_used(self) -> List[str]:
+        return sorted(self.counts['tags'])
+
+
+def load_stats(data: Dict) -> MomentsStats:
+    """Stats of a moments.json document, rebuilt once if the block is missing"""
+    stats = MomentsStats.from_dict(data.get('stats'))
+    if stats is None:
+        stats = MomentsStats.from_moments(data.get('moments', []))
+    return stats
+
+
+def print_counter(title: str, counter: Dict[str, int], top: int, by_name: bool = False):
+    print(f"\n{title}")
+    if by_name:
+        ranked = sorted(counter.items(), reverse=True)
+    else:
+        ranked = sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+    for name, count in ranked[:top]:
+        print(f"  {name:20} {count:5d}")
+    if len(ranked) > top:
+        print(f"  ... {len(ranked) - top} autres")
+
+
+def main():
+    from moments_reader import DEFAULT_MOMENTS_FILE, MomentsReader
+
+    top = 10
+    if '--top' in sys.argv:
+        top = int(sys.argv[sys.argv.index('--top') + 1])
+
+    if '--rebuild' in sys.argv:
+        import json
+        from moments_reader import stamp_generation, write_snapshot
+
+        with open(DEFAULT_MOMENTS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data['stats'] = MomentsStats.from_moments(data.get('moments', [])).to_dict()
+        stamp_generation(data)
+        with open(DEFAULT_MOMENTS_FILE, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        write_snapshot(data, DEFAULT_MOMENTS_FILE)
+        print("✅ Stats rebuilt")
+
+    stats = MomentsStats.from_dict(MomentsReader(DEFAULT_MOMENTS_FILE).metadata.get('stats'))
+    if stats is None:
+        print("❌ No stats block yet, run with --rebuild")
+        sys.exit(1)
+
+    print(f"📊 {stats.total_moments} moments")
+    print_counter("🏷️  Tags", stats.counts['tags'], top)
+    print_counter("🎨 Couleurs", stats.counts['colors'], top)
+    print_counter("📖 Livres", stats.counts['books'], top)
+    print_counter("🗓️  Mois", stats.counts['months'], top, by_name=True)
+    print_counter("🔗 Tags associés", stats.counts['tag_pairs'], top)
+
+
+if __name__ == "__main__":
+    main()
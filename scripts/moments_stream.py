@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Streaming load/save of moments.json
+
+json.load/json.dump rebuild the whole document in memory. Stages that only
+walk the moments (fill, tag) use this module instead:
+- iter_moments() parses moments.json incrementally and yields one moment at
+  a time; the other top-level fields are collected into a dict
+- MomentsWriter writes moments.json (same layout as json.dump(indent=2))
+  and its snapshot one moment at a time, then swaps the files in atomically
+
+Usage:
+    python moments_stream.py --bench 100000   # peak RSS, json vs streaming
+"""
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from moments_reader import DEFAULT_MOMENTS_FILE, MomentsReader, SnapshotWriter, stamp_generation
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class _StreamParser:
+    """Minimal incremental parser for a top-level JSON object"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Append a chunk to the buffer, dropping what was already consumed"""
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of input)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in moments.json, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value, reading more input if it is incomplete"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number ending exactly at the buffer end may be cut by the chunk boundary
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_moments(moments_file=DEFAULT_MOMENTS_FILE, metadata: Optional[Dict] = None) -> Iterator[Dict]:
+    """Yield moments from moments.json one at a time
+
+    Top-level fields other than `moments` are stored into `metadata` as they
+    are parsed; fields written after the moments list (the usual layout) are
+    only available once iteration is finished.
+    """
+    if metadata is None:
+        metadata = {}
+
+    with open(moments_file, 'r', encoding='utf-8') as f:
+        parser = _StreamParser(f)
+        parser.expect('{')
+        if parser.peek() == '}':
+            return
+        while True:
+            key = parser.value()
+            parser.expect(':')
+            if key == 'moments':
+                parser.expect('[')
+                if parser.peek() == ']':
+                    parser.pos += 1
+                else:
+                    while True:
+                        yield parser.value()
+                        if parser.peek() == ',':
+                            parser.pos += 1
+                            continue
+                        parser.expect(']')
+                        break
+            else:
+                metadata[key] = parser.value()
+
+            if parser.peek() == ',':
+                parser.pos += 1
+                continue
+            parser.expect('}')
+            return
+
+
+def read_metadata(moments_file=DEFAULT_MOMENTS_FILE) -> Dict:
+    """Top-level fields except moments: from the snapshot header when fresh, else a streaming pass"""
+    return dict(MomentsReader(moments_file).metadata)
+
+
+def _indent(text: str, prefix: str) -> str:
+    return text.replace('\n', '\n' + prefix)
+
+
+class MomentsWriter:
+    """Write moments.json and its snapshot one moment at a time
+
+    Usage:
+        with MomentsWriter(path) as writer:
+            for moment in ...:
+                writer.write(moment)
+            writer.metadata.update(...)
+
+    Output matches json.dump(data, indent=2, ensure_ascii=False) with
+    `moments` as the first key and a new `generation` as the last. Files are only replaced when the block exits
+    without an exception.
+    """
+
+    def __init__(self, moments_file=DEFAULT_MOMENTS_FILE, snapshot: bool = True):
+        self.moments_file = Path(moments_file)
+        self.metadata: Dict = {}
+        self.count = 0
+        self._tmp_file = self.moments_file.with_name(self.moments_file.name + '.tmp')
+        self._f = open(self._tmp_file, 'w', encoding='utf-8')
+        self._f.write('{\n  "moments": [')
+        self._snapshot = SnapshotWriter(self.moments_file) if snapshot else None
+
+    def write(self, moment: Dict):
+        self._f.write(',\n    ' if self.count else '\n    ')
+        self._f.write(_indent(json.dumps(moment, indent=2, ensure_ascii=False), '    '))
+        if self._snapshot is not None:
+            self._snapshot.add(moment)
+        self.count += 1
+
+    def close(self):
+        stamp_generation(self.metadata)
+        self._f.write('\n  ]' if self.count else ']')
+        for key, value in self.metadata.items():
+            self._f.write(f',\n  {json.dumps(key, ensure_ascii=False)}: ')
+            self._f.write(_indent(json.dumps(value, indent=2, ensure_ascii=False), '  '))
+        self._f.write('\n}')
+        self._f.close()
+        os.replace(self._tmp_file, self.moments_file)
+        if self._snapshot is not None:
+            self._snapshot.close(self.metadata)
+
+    def abort(self):
+        self._f.close()
+        try:
+            os.remove(self._tmp_file)
+        except OSError:
+            pass
+        if self._snapshot is not None:
+            self._snapshot.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+# -- benchmark --
+
+def _make_archive(path: Path, total: int):
+    """Synthetic archive shaped like moments.json"""
+    with MomentsWriter(path, snapshot=False) as writer:
+        for i in range(total):
+            writer.write({
+                'content': f"Note {i} : confie-toi en l'Éternel de tout ton cœur.",
+                'color': 'fffeca' if i % 3 else None,
+                'references': [{
+                    'usfm': [f"PRO.3.{i % 30 + 1}"],
+                    'version_id': 133,
+                    'human': f"Proverbes 3:{i % 30 + 1}",
+                    'human_text': "Confie-toi en l'Éternel de tout ton cœur, et ne t'appuie pas sur ta sagesse. " * 2
+                }],
+                'tag': ['esperance', 'priere'],
+                'created_dt': f"2025-{i % 12 + 1:02d}-01T00:00:00+00:00"
+            })
+        writer.metadata['total_moments'] = total
+
+
+def _bench_child(mode: str, path: str):
+    """Load and rewrite the archive, then print peak RSS (run in a subprocess)"""
+    import resource
+
+    if mode == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for moment in data['moments']:
+            moment['content'] = moment['content'].upper()
+        with open(path + '.out', 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    else:
+        metadata = {}
+        with MomentsWriter(path + '.out', snapshot=False) as writer:
+            for moment in iter_moments(path, metadata):
+                moment['content'] = moment['content'].upper()
+                writer.write(moment)
+            writer.metadata.update(metadata)
+
+    # ru_maxrss is in KiB on Linux
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def bench(total: int):
+    import subprocess
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'moments.json'
+        _make_archive(path, total)
+        size_mib = path.stat().st_size / 1024 / 1024
+        print(f"📊 {total} moments, {size_mib:.1f} MiB")
+
+        for mode in ('json', 'stream'):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, __file__, '--bench-child', mode, str(path)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            elapsed = time.perf_counter() - start
+            peak_mib = int(output.strip().splitlines()[-1]) / 1024
+            print(f"  {mode:7} peak RSS {peak_mib:7.1f} MiB  ({elapsed:.2f}s)")
+
+
+def main():
+    if '--bench-child' in sys.argv:
+        index = sys.argv.index('--bench-child')
+        _bench_child(sys.argv[index + 1], sys.argv[index + 2])
+    elif '--bench' in sys.argv:
+        index = sys.argv.index('--bench')
+        bench(int(sys.argv[index + 1]) if len(sys.argv) > index + 1 else 100_000)
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Multi-account YouVersion sync
+
+Fetches the moments of several users, each into its own partition
+(fetch_moments.partition_file): the default user keeps the root moments.json,
+the other accounts get users/<user_id>/moments.json with their own snapshot,
+indexes and exports, so one user's notes never reach another's consumers:
+- one bounded thread pool and one connection-pooled requests.Session for all
+  page fetches, with a per-host rate limit
+- each user's pages are chained (page n+1 is only scheduled once page n came
+  back non-empty), but different users run concurrently, so N users take
+  about as long as the slowest one
+- each partition keeps its watermark in `last_update_by_user`, and every
+  moment records its `user_id`
+
+Accounts come from YOUVERSION_ACCOUNTS, as "user_id:token,user_id:token".
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from fetch_moments import MomentsFetcher
+from http_transport import open_transport
+
+
+class RateLimiter:
+    """Minimum interval between requests to the same host, shared across threads"""
+
+    def __init__(self, requests_per_second: float = 4.0):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def parse_accounts(value: Optional[str]) -> List[Tuple[str, str]]:
+    """'user1:token1,user2:token2' -> [('user1', 'token1'), ('user2', 'token2')]"""
+    accounts = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        user_id, _, token = item.partition(':')
+        if not user_id or not token:
+            raise ValueError(f"Invalid account '{user_id}': expected user_id:token")
+        accounts.append((user_id.strip(), token.strip()))
+    return accounts
+
+
+class MultiUserSync:
+    def __init__(self, accounts: List[Tuple[str, str]], max_workers: int = 4,
+                 requests_per_second: float = 4.0):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        if not accounts:
+            raise ValueError("At least one (user_id, token) account is required")
+
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(requests_per_second)
+
+        # One keep-alive connection per worker, reused by every account
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Record/replay (HTTP_TRANSPORT_MODE) wraps the shared session once for every account
+        self.http = open_transport(self.session)
+        # Each fetcher keeps its own HttpCache, so saving a partition only commits that user's pages
+        self.fetchers = [
+            MomentsFetcher(user_id, token, session=self.http, rate_limiter=self.rate_limiter)
+            for user_id, token in accounts
+        ]
+
+    def fetch_all(self) -> Dict[str, List[Dict]]:
+        """Fetch every account's new moments on the shared pool"""
+        for fetcher in self.fetchers:
+            fetcher.start_fetch()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {
+                pool.submit(fetcher.fetch_moments_page, 1): (fetcher, 1)
+                for fetcher in self.fetchers
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    fetcher, page = pending.pop(future)
+                    # collect_page runs on this thread only, so fetcher state needs no lock
+                    if fetcher.collect_page(page, future.result()):
+                        pending[pool.submit(fetcher.fetch_moments_page, page + 1)] = (fetcher, page + 1)
+
+        new_moments = {}
+        for fetcher in self.fetchers:
+            new_moments[fetcher.user_id] = fetcher.finish_fetch()
+            print(f"👤 {fetcher.user_id}: {len(new_moments[fetcher.user_id])} new moments")
+        return new_moments
+
+    def run(self):
+        """Main execution method"""
+        print(f"Starting YouVersion moments sync for {len(self.fetchers)} accounts...")
+        start = time.perf_counter()
+
+        for fetcher in self.fetchers:
+            fetcher.load_existing_data()
+
+        new_moments = self.fetch_all()
+        print(f"⏱️  Fetched in {time.perf_counter() - start:.1f}s")
+
+        # Partitions are saved and processed one after the other (text filling and tags have their own pacing)
+        for fetcher in self.fetchers:
+            print(f"\n👤 {fetcher.user_id} -> {fetcher.moments_file}")
+            fetcher.save_and_process(new_moments[fetcher.user_id])
+
+
+def main():
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    accounts = parse_accounts(os.getenv('YOUVERSION_ACCOUNTS'))
+    if not accounts:
+        raise ValueError("YOUVERSION_ACCOUNTS environment variable is required (user_id:token,...)")
+
+    max_workers = int(os.getenv('SYNC_MAX_WORKERS', '4'))
+    requests_per_second = float(os.getenv('SYNC_REQUESTS_PER_SECOND', '4'))
+    MultiUserSync(accounts, max_workers, requests_per_second).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Full-text and verse search index over moments
+
+- inverted index over `content` and `human_text` with accent folding and a
+  light French stemmer, ranked with BM25
+- interval index over the USFM verses of each reference, per book
+
+The index is stored next to moments.json (moments_index.json) and updated
+incrementally: only moments whose text changed are re-indexed.
+
+Usage:
+    python search_index.py pardon               # full-text
+    python search_index.py --verse "Jean 14"    # verse range (or Jean, JHN.14, JHN.14.6-7)
+    python search_index.py --rebuild
+"""
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+from bisect import bisect_right
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from moments_keys import iter_keyed_moments
+from moments_reader import DEFAULT_MOMENTS_FILE, MomentsReader
+
+INDEX_VERSION = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_WORD_RE = re.compile(r"\w+")
+_VERSE_QUERY_RE = re.compile(r"^(.+?)[\s.]+(\d+)(?:[:.](\d+)(?:-(\d+))?)?$")
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces cet cette dans de des du elle en et eux il ils je la le les leur leurs lui
+ma mais me meme mes moi mon ne nos notre nous on ou par pas pour qu que qui sa se ses son sur
+ta te tes toi ton tu un une vos votre vous c d j l m n s t y est sont ete etre a ai as avons
+""".split())
+
+# Longest first; a suffix is only stripped if at least 3 characters remain
+_SUFFIXES = (
+    'issements', 'issement', 'atrices', 'atrice', 'ateurs', 'ateur', 'ations', 'ation',
+    'ements', 'ement', 'ances', 'ance', 'ences', 'ence', 'euses', 'euse', 'ables', 'able',
+    'ibles', 'ible', 'istes', 'iste', 'ismes', 'isme', 'ites', 'ite', 'ives', 'ive',
+    'eaux', 'eux', 'aient', 'ait', 'ant', 'ees', 'ee', 'er', 'ez', 'es', 'e', 's', 'x'
+)
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents: 'Éternel' -> 'eternel'"""
+    decomposed = unicodedata.normalize('NFD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def stem(word: str) -> str:
+    """Very light French stemmer: pardonner, pardonné, pardons -> pardon"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    # pardonn -> pardon
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] in 'lnst':
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(word) for word in _WORD_RE.findall(fold(text))
+            if word not in STOPWORDS and not word.isdigit()]
+
+
+def usfm_position(usfm: str) -> Optional[Tuple[str, int]]:
+    """MAT.4.7 -> ('MAT', 4007)"""
+    parts = usfm.split('.')
+    if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    return parts[0], int(parts[1]) * 1000 + int(parts[2])
+
+
+def index_path_for(moments_file) -> Path:
+    return Path(moments_file).with_name('moments_index.json')
+
+
+class SearchIndex:
+    """Inverted + verse interval index, keyed by moment_key()"""
+
+    def __init__(self, index_file):
+        self.index_file = Path(index_file)
+        self.docs: Dict[str, Dict] = {}           # key -> {'pos', 'len', 'sig', 'terms', 'verses'}
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {key: tf}
+        self.book_names: Dict[str, str] = {}      # folded human book name -> USFM code
+        self.total_len = 0                        # sum of docs' 'len', for BM25's average length
+        self._intervals = None                    # book -> (starts, [(start, end, key)], max_span), built lazily
+
+    @classmethod
+    def load(cls, index_file) -> 'SearchIndex':
+        index = cls(index_file)
+        if index.index_file.exists():
+            with open(index.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                index.docs = data.get('docs', {})
+                index.postings = data.get('postings', {})
+                index.book_names = data.get('book_names', {})
+                total_len = data.get('total_len')
+                index.total_len = total_len if total_len is not None else sum(doc['len'] for doc in index.docs.values())
+        return index
+
+    def save(self):
+        data = {
+            'version': INDEX_VERSION,
+            'docs': self.docs,
+            'postings': self.postings,
+            'book_names': self.book_names,
+            'total_len': self.total_len
+        }
+        tmp_file = self.index_file.with_name(self.index_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, self.index_file)
+
+    # -- maintenance --
+
+    def _add(self, key: str, moment: Dict, position: int, signature: str):
+        text = moment.get('content', '') + ' ' + ' '.join(
+            ref.get('human_text', '') or '' for ref in moment.get('references', []))
+        terms: Dict[str, int] = {}
+        for term in tokenize(text):
+            terms[term] = terms.get(term, 0) + 1
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[key] = tf
+
+        verses = []
+        for ref in moment.get('references', []):
+            positions = [p for p in map(usfm_position, ref.get('usfm', [])) if p]
+            if not positions:
+                continue
+            book = positions[0][0]
+            points = [p for b, p in positions if b == book]
+            verses.append([book, min(points), max(points)])
+            human = ref.get('human', '')
+            name = human.rsplit(' ', 1)[0] if ' ' in human else ''
+            if name:
+                self.book_names[fold(name)] = book
+
+        self.docs[key] = {
+            'pos': position,
+            'len': sum(terms.values()),
+            'sig': signature,
+            'terms': list(terms),
+            'verses': verses
+        }
+        self.total_len += self.docs[key]['len']
+
+    def _remove(self, key: str):
+        doc = self.docs.pop(key)
+        self.total_len -= doc['len']
+        for term in doc['terms']:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self.postings[term]
+
+    def update(self, moments: Iterable[Dict]) -> Tuple[int, int]:
+        """Sync the index with the archive; returns (indexed, removed)"""
+        import hashlib
+
+        seen = set()
+        indexed = 0
+        for position, (key, moment) in enumerate(iter_keyed_moments(moments)):
+            seen.add(key)
+
+            signature_text = '\x1f'.join(
+                ref.get('human_text', '') or '' for ref in moment.get('references', []))
+            signature = hashlib.sha1(signature_text.encode('utf-8')).hexdigest()[:12]
+
+            doc = self.docs.get(key)
+            if doc is not None and doc['sig'] == signature:
+                doc['pos'] = position
+                continue
+            if doc is not None:
+                self._remove(key)
+            self._add(key, moment, position, signature)
+            indexed += 1
+
+        removed = [key for key in self.docs if key not in seen]
+        for key in removed:
+            self._remove(key)
+
+        self._intervals = None
+        return indexed, len(removed)
+
+    # -- queries --
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Rank moments for a free-text query with BM25"""
+        terms = tokenize(query)
+        if not terms or not self.docs:
+            return []
+
+        total_docs = len(self.docs)
+        avg_len = self.total_len / total_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (total_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for key, tf in posting.items():
+                doc_len = self.docs[key]['len']
+                score = idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc_len / avg_len))
+                scores[key] = scores.get(key, 0.0) + score
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit]
+
+    def _build_intervals(self):
+        by_book: Dict[str, List[Tuple[int, int, str]]] = {}
+        for key, doc in self.docs.items():
+            for book, start, end in doc['verses']:
+                by_book.setdefault(book, []).append((start, end, key))
+        self._intervals = {}
+        for book, intervals in by_book.items():
+            intervals.sort()
+            max_span = max(end - start for start, end, _ in intervals)
+            self._intervals[book] = ([start for start, _, _ in intervals], intervals, max_span)
+
+    def parse_verse_query(self, query: str) -> Optional[Tuple[str, int, int]]:
+        """'Jean', 'JHN.3', 'JHN.3.16', 'Jean 3:16-18' -> (book, start, end)"""
+        query = query.strip()
+        match = _VERSE_QUERY_RE.match(query)
+        name, chapter, verse, verse_end = match.groups() if match else (query, None, None, None)
+        book = name.upper() if name.upper() in self._books() else self.book_names.get(fold(name))
+        if not book:
+            return None
+        if chapter is None:
+            return book, 0, 999999
+        chapter = int(chapter)
+        if verse is None:
+            return book, chapter * 1000, chapter * 1000 + 999
+        start = chapter * 1000 + int(verse)
+        end = chapter * 1000 + int(verse_end) if verse_end else start
+        return book, start, end
+
+    def _books(self):
+        if self._intervals is None:
+            self._build_intervals()
+        return self._intervals
+
+    def search_verses(self, query: str) -> List[str]:
+        """Moments whose references overlap a verse range, in archive order"""
+        parsed = self.parse_verse_query(query)
+        if not parsed:
+            return []
+        book, start, end = parsed
+        entry = self._books().get(book)
+        if not entry:
+            return []
+
+        starts, intervals, max_span = entry
+        # Only intervals starting in [start - max_span, end] can overlap
+        lo = bisect_right(starts, start - max_span - 1)
+        hi = bisect_right(starts, end)
+        keys = {key for s, e, key in intervals[lo:hi] if e >= start}
+        return sorted(keys, key=lambda key: self.docs[key]['pos'])
+
+
+def update_index(moments_file=DEFAULT_MOMENTS_FILE, rebuild: bool = False) -> SearchIndex:
+    """Bring moments_index.json up to date with the archive"""
+    index_file = index_path_for(moments_file)
+    index = SearchIndex(index_file) if rebuild else SearchIndex.load(index_file)
+    indexed, removed = index.update(MomentsReader(moments_file))
+    index.save()
+    print(f"🔎 Search index: {indexed} moments indexed, {removed} removed ({len(index.docs)} total)")
+    return index
+
+
+def print_results(reader: MomentsReader, index: SearchIndex, results):
+    for key, score in results:
+        moment = reader[index.docs[key]['pos']]
+        refs = ', '.join(ref.get('human', '') for ref in moment.get('references', []))
+        score_text = f" ({score:.2f})" if score is not None else ""
+        print(f"📖 {refs}{score_text}")
+        if moment.get('content'):
+            print(f"   💭 {moment['content'][:100]}")
+
+
+def main():
+    args = sys.argv[1:]
+    moments_file = DEFAULT_MOMENTS_FILE
+
+    if '--rebuild' in args:
+        update_index(moments_file, rebuild=True)
+        return
+
+    index_file = index_path_for(moments_file)
+    if not index_file.exists():
+        update_index(moments_file)
+    index = SearchIndex.load(index_file)
+    reader = MomentsReader(moments_file)
+
+    if args and args[0] == '--verse':
+        query = ' '.join(args[1:])
+        keys = index.search_verses(query)
+        print(f"🔍 {len(keys)} moments for {query}")
+        print_results(reader, index, [(key, None) for key in keys])
+    elif args:
+        query = ' '.join(args)
+        results = index.search(query)
+        print(f"🔍 {len(results)} results for '{query}'")
+        print_results(reader, index, results)
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,30 +3,73 @@
 Script to send a random verse from moments.json via ntfy.
 """
 
-import json
+import hashlib
 import random
-import requests
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
+
+from moments_reader import MomentsReader
 
 sys.stdout.reconfigure(encoding='utf-8')
 
-def load_moments(moments_path: Path) -> dict:
-    """Load moments from JSON file."""
-    with open(moments_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+# Sends start at 6am UTC, every 2 hours (see .github/workflows/send-verse.yml)
+SERIES_START_HOUR = 6
+SERIES_INTERVAL_HOURS = 2
 
+def load_moments(moments_path: Path) -> MomentsReader:
+    """Open the moments archive (compact snapshot when available)."""
+    return MomentsReader(moments_path)
 
-def select_random_verse(moments_data: dict) -> dict:
-    """Select a random verse from moments."""
-    moments = moments_data.get('moments', [])
-    
+
+def select_random_verse(moments) -> dict:
+    """Select a random verse from moments (reader or list)."""
     if not moments:
         raise ValueError("No moments found in the JSON file")
     
     return random.choice(moments)
 
 
+def select_series_verse(moments, moments_path: Path, now: Optional[datetime] = None) -> Optional[dict]:
+    """Thematic series: the day's seed moment first, then its closest neighbours.
+    
+    Returns None when the similarity index (or numpy) is not available.
+    """
+    try:
+        from similarity_index import SimilarityIndex
+    except ImportError:
+        return None
+    
+    try:
+        index = SimilarityIndex.load(moments_path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Similarity index unavailable: {e}")
+        return None
+    if not index.rows or not moments:
+        return None
+    
+    now = now or datetime.now(timezone.utc)
+    day_hash = hashlib.sha1(now.date().isoformat().encode('utf-8')).hexdigest()
+    seed_key = index.key_at(int(day_hash, 16) % len(moments))
+    if seed_key is None or seed_key not in index.rows:
+        return None
+    
+    slot = max(0, (now.hour - SERIES_START_HOUR) // SERIES_INTERVAL_HOURS)
+    if slot == 0:
+        return moments[index.positions[seed_key]]
+    
+    try:
+        neighbours = index.similar_to_keys([seed_key], k=slot)[0]
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Similarity index unavailable: {e}")
+        return None
+    if not neighbours:
+        return None
+    key, _ = neighbours[min(slot, len(neighbours)) - 1]
+    return moments[index.positions[key]]
+
+
 def format_verse_message(verse: dict) -> tuple[str, str]:
     """Format verse into title and message for ntfy."""
     # Get the content
@@ -70,7 +113,9 @@ def send_to_ntfy(title: str, message: str, ntfy_url: str = "https://ntfy.sh/vers
         print(f"Message: {message}")
         return
     
-    response = requests.post(
+    from http_transport import open_transport
+    
+    response = open_transport().post(
         ntfy_url,
         data=message.encode('utf-8'),
         headers=headers
@@ -94,18 +139,22 @@ def main():
     
     # Check for dry run mode
     dry_run = '--dry-run' in sys.argv
+    series = '--series' in sys.argv
     
     print(f"📚 Loading moments from: {moments_path}")
     
     try:
         # Load moments
-        moments_data = load_moments(moments_path)
-        total_moments = len(moments_data.get('moments', []))
-        print(f"📊 Found {total_moments} moments")
+        moments = load_moments(moments_path)
+        print(f"📊 Found {len(moments)} moments")
         
-        # Select random verse
-        verse = select_random_verse(moments_data)
-        print(f"🎲 Selected random verse")
+        # Select a verse from today's thematic series, or a random one
+        verse = select_series_verse(moments, moments_path) if series else None
+        if verse is not None:
+            print(f"🧭 Selected verse from today's series")
+        else:
+            verse = select_random_verse(moments)
+            print(f"🎲 Selected random verse")
         
         # Format message
         title, message = format_verse_message(verse)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Local similarity index for "related moments"
+
+Each moment becomes a hashed feature vector (stemmed words and word pairs of
+content + verse text, tags, book/chapter), L2-normalised and stored as one
+float16 row (1 KiB) of a matrix on disk:
+- moments_vectors.f16: the raw matrix, only ever appended to, read via np.memmap
+- moments_vectors.json: row -> moment key, signatures, dead rows, positions
+
+Both files are derived data and are not committed: hashed features need no
+fitted vocabulary, so any job can rebuild them from moments.json (the
+workflows keep them in actions/cache to only add new moments).
+
+Queries are batched cosine top-k over memmapped chunks, so neither building
+nor querying loads the whole archive or matrix at once. CPU only, numpy only.
+
+Usage:
+    python similarity_index.py --update
+    python similarity_index.py --rebuild
+    python similarity_index.py "confiance dans l'épreuve"
+    python similarity_index.py --like 0        # moments like moments[0]
+"""
+import hashlib
+import json
+import math
+import os
+import sys
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from moments_keys import iter_keyed_moments
+from moments_reader import DEFAULT_MOMENTS_FILE, MomentsReader
+from search_index import tokenize
+from moments_stats import tag_names
+
+INDEX_VERSION = 2
+DIMS = 512
+CHUNK_ROWS = 8192
+# Stored as float16, scored as float32
+DTYPE = np.float16
+ROW_BYTES = np.dtype(DTYPE).itemsize
+
+# Feature weights
+WORD_WEIGHT = 1.0
+PAIR_WEIGHT = 0.5
+TAG_WEIGHT = 2.0
+CHAPTER_WEIGHT = 1.0
+
+# Rewrite the matrix once this share of rows is dead (changed or deleted moments)
+COMPACT_RATIO = 0.25
+
+
+def moment_text(moment: Dict) -> str:
+    return moment.get('content', '') + ' ' + ' '.join(
+        ref.get('human_text', '') or '' for ref in moment.get('references', []))
+
+
+def text_features(text: str) -> Dict[str, float]:
+    words = tokenize(text)
+    features: Dict[str, float] = {}
+    for word in words:
+        features['w:' + word] = features.get('w:' + word, 0.0) + WORD_WEIGHT
+    for first, second in zip(words, words[1:]):
+        pair = f"p:{first}_{second}"
+        features[pair] = features.get(pair, 0.0) + PAIR_WEIGHT
+    return features
+
+
+def moment_features(moment: Dict) -> Dict[str, float]:
+    features = text_features(moment_text(moment))
+    for tag in tag_names(moment.get('tag', '')):
+        features['t:' + tag] = TAG_WEIGHT
+    for ref in moment.get('references', []):
+        for usfm in ref.get('usfm', [])[:1]:
+            chapter = '.'.join(usfm.split('.')[:2])
+            features['c:' + chapter] = CHAPTER_WEIGHT
+    return features
+
+
+def vectorize(features: Dict[str, float], dims: int = DIMS) -> np.ndarray:
+    """Signed feature hashing with sublinear weights, L2-normalised"""
+    vector = np.zeros(dims, dtype=np.float32)
+    for feature, weight in features.items():
+        h = zlib.crc32(feature.encode('utf-8'))
+        sign = 1.0 if h & 0x80000000 else -1.0
+        value = 1.0 + math.log(weight) if weight >= 1 else weight
+        vector[h % dims] += sign * value
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+def moment_signature(moment: Dict) -> str:
+    text = moment_text(moment) + '\x1f' + ','.join(tag_names(moment.get('tag', '')))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def index_paths_for(moments_file) -> Tuple[Path, Path]:
+    base = Path(moments_file).with_name('moments_vectors')
+    return base.with_suffix('.f16'), base.with_suffix('.json')
+
+
+class SimilarityIndex:
+    def __init__(self, matrix_file, meta_file, dims: int = DIMS):
+        self.matrix_file = Path(matrix_file)
+        self.meta_file = Path(meta_file)
+        self.dims = dims
+        self.keys: List[str] = []              # row -> moment key ('' for dead rows)
+        self.rows: Dict[str, int] = {}         # key -> live row
+        self.signatures: Dict[str, str] = {}   # key -> signature of the indexed text
+        self.positions: Dict[str, int] = {}    # key -> position in the archive
+
+    @classmethod
+    def load(cls, moments_file=DEFAULT_MOMENTS_FILE) -> 'SimilarityIndex':
+        matrix_file, meta_file = index_paths_for(moments_file)
+        index = cls(matrix_file, meta_file)
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if meta.get('version') != INDEX_VERSION or not matrix_file.exists():
+            return index
+        # Metadata ahead of the matrix (rows lost): unusable, the next update rebuilds it.
+        # Extra rows (appended by an update that never saved) are dropped by update().
+        if matrix_file.stat().st_size < len(meta['keys']) * meta['dims'] * ROW_BYTES:
+            return index
+        index.dims = meta['dims']
+        index.keys = meta['keys']
+        index.signatures = meta['signatures']
+        index.positions = meta['positions']
+        index.rows = {key: row for row, key in enumerate(index.keys) if key}
+        return index
+
+    def save(self):
+        meta = {
+            'version': INDEX_VERSION,
+            'dims': self.dims,
+            'keys': self.keys,
+            'signatures': self.signatures,
+            'positions': self.positions
+        }
+        tmp_file = self.meta_file.with_name(self.meta_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, separators=(',', ':'))
+        os.replace(tmp_file, self.meta_file)
+
+    def matrix(self) -> np.ndarray:
+        """Read-only memmap of all rows (live and dead)"""
+        if not self.keys:
+            return np.zeros((0, self.dims), dtype=DTYPE)
+        return np.memmap(self.matrix_file, dtype=DTYPE, mode='r', shape=(len(self.keys), self.dims))
+
+    # -- maintenance --
+
+    def _append(self, vectors: List[np.ndarray], keys: List[str]):
+        if not vectors:
+            return
+        with open(self.matrix_file, 'ab') as f:
+            f.write(np.vstack(vectors).astype(DTYPE).tobytes())
+        for key in keys:
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+
+    def _kill(self, key: str):
+        row = self.rows.pop(key)
+        self.keys[row] = ''
+
+    def compact(self):
+        """Drop dead rows by rewriting the matrix"""
+        live = [row for row, key in enumerate(self.keys) if key]
+        matrix = self.matrix()
+        tmp_file = self.matrix_file.with_name(self.matrix_file.name + '.tmp')
+        with open(tmp_file, 'wb') as f:
+            for start in range(0, len(live), CHUNK_ROWS):
+                f.write(np.asarray(matrix[live[start:start + CHUNK_ROWS]]).tobytes())
+        del matrix
+        os.replace(tmp_file, self.matrix_file)
+        self.keys = [self.keys[row] for row in live]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+
+    def update(self, moments: Iterable[Dict]) -> Tuple[int, int]:
+        """Append vectors for new or changed moments; returns (added, removed)"""
+        # Drop rows written after the last save (or the whole matrix when there is no metadata),
+        # so appended rows line up with self.keys again
+        if self.matrix_file.exists():
+            expected = len(self.keys) * self.dims * ROW_BYTES
+            if self.matrix_file.stat().st_size != expected:
+                with open(self.matrix_file, 'r+b') as f:
+                    f.truncate(expected)
+
+        seen = set()
+        positions = {}
+        pending_vectors, pending_keys = [], []
+        added = 0
+        for position, (key, moment) in enumerate(iter_keyed_moments(moments)):
+            seen.add(key)
+            positions[key] = position
+
+            signature = moment_signature(moment)
+            if self.signatures.get(key) == signature and key in self.rows:
+                continue
+            if key in self.rows:
+                self._kill(key)
+            self.signatures[key] = signature
+            pending_vectors.append(vectorize(moment_features(moment), self.dims))
+            pending_keys.append(key)
+            added += 1
+
+            if len(pending_vectors) >= CHUNK_ROWS:
+                self._append(pending_vectors, pending_keys)
+                pending_vectors, pending_keys = [], []
+        self._append(pending_vectors, pending_keys)
+
+        removed = [key for key in self.rows if key not in seen]
+        for key in removed:
+            self._kill(key)
+            self.signatures.pop(key, None)
+        self.positions = positions
+
+        dead = len(self.keys) - len(self.rows)
+        if dead and dead >= COMPACT_RATIO * len(self.keys):
+            self.compact()
+        return added, len(removed)
+
+    # -- queries --
+
+    def query(self, vectors: np.ndarray, k: int = 5, exclude: Optional[List[Optional[str]]] = None) -> List[List[Tuple[str, float]]]:
+        """Top-k cosine neighbours for each row of `vectors` (batched over matrix chunks)"""
+        vectors = np.atleast_2d(vectors).astype(np.float32)
+        batch = vectors.shape[0]
+        best_scores = np.full((batch, 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((batch, 0), dtype=np.int64)
+
+        matrix = self.matrix()
+        dead = np.array([not key for key in self.keys], dtype=bool)
+        excluded_rows = [self.rows.get(key, -1) if key else -1 for key in (exclude or [None] * batch)]
+
+        for start in range(0, matrix.shape[0], CHUNK_ROWS):
+            chunk = np.asarray(matrix[start:start + CHUNK_ROWS], dtype=np.float32)
+            scores = vectors @ chunk.T
+            scores[:, dead[start:start + chunk.shape[0]]] = -np.inf
+            for i, row in enumerate(excluded_rows):
+                if start <= row < start + chunk.shape[0]:
+                    scores[i, row - start] = -np.inf
+            rows = np.broadcast_to(np.arange(start, start + chunk.shape[0]), scores.shape)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        results = []
+        for i in range(batch):
+            order = np.argsort(-best_scores[i])
+            results.append([
+                (self.keys[best_rows[i, j]], float(best_scores[i, j]))
+                for j in order if np.isfinite(best_scores[i, j])
+            ])
+        return results
+
+    def similar_to_keys(self, keys: List[str], k: int = 5) -> List[List[Tuple[str, float]]]:
+        """Neighbours of moments already in the index"""
+        matrix = self.matrix()
+        vectors = np.vstack([np.asarray(matrix[self.rows[key]], dtype=np.float32) for key in keys])
+        return self.query(vectors, k, exclude=keys)
+
+    def search_text(self, text: str, k: int = 5) -> List[Tuple[str, float]]:
+        return self.query(vectorize(text_features(text), self.dims), k)[0]
+
+    def key_at(self, position: int) -> Optional[str]:
+        for key, pos in self.positions.items():
+            if pos == position:
+                return key
+        return None
+
+
+def update_index(moments_file=DEFAULT_MOMENTS_FILE, rebuild: bool = False) -> SimilarityIndex:
+    """Bring moments_vectors.* up to date with the archive"""
+    if rebuild:
+        matrix_file, meta_file = index_paths_for(moments_file)
+        index = SimilarityIndex(matrix_file, meta_file)
+    else:
+        index = SimilarityIndex.load(moments_file)
+    added, removed = index.update(MomentsReader(moments_file))
+    index.save()
+    print(f"🧭 Similarity index: {added} moments added, {removed} removed ({len(index.rows)} total)")
+    return index
+
+
+def print_results(reader: MomentsReader, index: SimilarityIndex, results):
+    for key, score in results:
+        moment = reader[index.positions[key]]
+        refs = ', '.join(ref.get('human', '') for ref in moment.get('references', []))
+        print(f"📖 {refs} ({score:.2f})")
+        if moment.get('content'):
+            print(f"   💭 {moment['content'][:100]}")
+
+
+def main():
+    args = sys.argv[1:]
+    moments_file = DEFAULT_MOMENTS_FILE
+
+    if '--rebuild' in args or '--update' in args:
+        update_index(moments_file, rebuild='--rebuild' in args)
+        return
+
+    index = SimilarityIndex.load(moments_file)
+    if not index.rows:
+        index = update_index(moments_file)
+    reader = MomentsReader(moments_file)
+
+    if args and args[0] == '--like':
+        position = int(args[1])
+        key = index.key_at(position)
+        if key is None:
+            print(f"❌ No moment at position {position}")
+            sys.exit(1)
+        print(f"🔍 Moments like #{position}")
+        print_results(reader, index, index.similar_to_keys([key])[0])
+    elif args:
+        query = ' '.join(args)
+        print(f"🔍 Moments like '{query}'")
+        print_results(reader, index, index.search_text(query))
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()